@@ -1,14 +1,85 @@
 import json
+import time
+from typing import AsyncIterator, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
-import httpx
+from pydantic import ValidationError
 
 from config import settings
+from shared.metrics import Histogram
+from shared.tracing import add_span, current_request_id, merge_server_timing
 from api.deps import get_current_user
 from models.all_models import User
+from schemas.all_schemas import RagChatOptions
 
 router = APIRouter()
 
+LLM_TTFB_SECONDS = Histogram("llm_proxy_ttfb_seconds", "Time from the upstream request to its first streamed chunk")
+LLM_STREAM_SECONDS = Histogram("llm_proxy_stream_seconds", "Duration of a proxied completion stream", ("outcome",))
+
+def _provider(request: Request):
+    # 获取自带密钥并提供双重兜底 (BYOK)
+    custom_key = request.headers.get("x-provider-key")
+    custom_base_url = request.headers.get("x-provider-baseurl")
+    
+    # 最终采用的 Provider 配置
+    active_key = custom_key if custom_key else settings.OPENAI_API_KEY
+    active_base_url = custom_base_url if custom_base_url else settings.OPENAI_BASE_URL
+    return active_key, active_base_url
+
+async def mock_stream():
+    # Dummy Response for testing if no key is set
+    words = ["你好，", "我是", " EduAIHub", " 的", "专属 AI", "。由于未配置后端 API KEY 且您未提供自定义私钥，", "这是", "一段", "模拟的流式输出~"]
+    for w in words:
+        chunk = {"choices": [{"delta": {"content": w}}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+async def proxy_stream(request: Request, active_key: str, active_base_url: str, body: Dict) -> AsyncIterator:
+    headers = {
+        "Authorization": f"Bearer {active_key}",
+        "Content-Type": "application/json",
+        # Providers that log a client request ID can be matched against our traces
+        "X-Request-ID": current_request_id() or ""
+    }
+    
+    # Optional stream force
+    body["stream"] = body.get("stream", True)
+    
+    start = time.perf_counter()
+    outcome = "error"
+    # Pooled client from the app lifespan: keep-alive connections per provider origin
+    async with request.app.state.upstream_clients.lease(active_base_url) as client:
+        try:
+            # 若 BaseURL 结尾没有 /chat/completions，这里应该如何拼装依据上游情况而定
+            # 标准化处理 endpoint
+            endpoint = f"{active_base_url.rstrip('/')}/chat/completions"
+            if "/chat/completions" in active_base_url: 
+                endpoint = active_base_url # 防止重复拼接
+                
+            async with client.stream(
+                "POST", 
+                endpoint,
+                json=body,
+                headers=headers
+            ) as response:
+                first = True
+                async for chunk in response.aiter_bytes():
+                    if first:
+                        LLM_TTFB_SECONDS.observe(time.perf_counter() - start)
+                        add_span("llm_ttfb", start, time.perf_counter() - start)
+                        first = False
+                    yield chunk
+                outcome = "ok" if response.status_code < 400 else "upstream_error"
+        except Exception as e:
+            error_chunk = {"choices": [{"delta": {"content": f"\n\n[网络错误: {str(e)}]"}}]}
+            yield f"data: {json.dumps(error_chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            LLM_STREAM_SECONDS.observe(time.perf_counter() - start, outcome)
+            # Runs after the response headers went out: only in the slow-trace dump
+            add_span("llm_stream", start, time.perf_counter() - start)
+
 @router.post("/chat/completions")
 async def chat_completions(
     request: Request,
@@ -21,53 +92,104 @@ async def chat_completions(
     3. 支持 OpenAI 流式返回格式。
     """
     body = await request.json()
-    
-    # 获取自带密钥并提供双重兜底 (BYOK)
-    custom_key = request.headers.get("x-provider-key")
-    custom_base_url = request.headers.get("x-provider-baseurl")
-    
-    # 最终采用的 Provider 配置
-    active_key = custom_key if custom_key else settings.OPENAI_API_KEY
-    active_base_url = custom_base_url if custom_base_url else settings.OPENAI_BASE_URL
+    active_key, active_base_url = _provider(request)
     
     if not active_key:
-        # Dummy Response for testing if no key is set
-        async def mock_stream():
-            words = ["你好，", "我是", " EduAIHub", " 的", "专属 AI", "。由于未配置后端 API KEY 且您未提供自定义私钥，", "这是", "一段", "模拟的流式输出~"]
-            for w in words:
-                chunk = {"choices": [{"delta": {"content": w}}]}
-                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-            yield "data: [DONE]\n\n"
         return StreamingResponse(mock_stream(), media_type="text/event-stream")
 
-    headers = {
-        "Authorization": f"Bearer {active_key}",
-        "Content-Type": "application/json"
-    }
-    
-    # Optional stream force
-    body["stream"] = body.get("stream", True)
-    
-    async def proxy_stream():
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                # 若 BaseURL 结尾没有 /chat/completions，这里应该如何拼装依据上游情况而定
-                # 标准化处理 endpoint
-                endpoint = f"{active_base_url.rstrip('/')}/chat/completions"
-                if "/chat/completions" in active_base_url: 
-                    endpoint = active_base_url # 防止重复拼接
-                    
-                async with client.stream(
-                    "POST", 
-                    endpoint,
-                    json=body,
-                    headers=headers
-                ) as response:
-                    async for chunk in response.aiter_bytes():
-                        yield chunk
-            except Exception as e:
-                error_chunk = {"choices": [{"delta": {"content": f"\n\n[网络错误: {str(e)}]"}}]}
-                yield f"data: {json.dumps(error_chunk, ensure_ascii=False)}\n\n"
-                yield "data: [DONE]\n\n"
+    return StreamingResponse(proxy_stream(request, active_key, active_base_url, body), media_type="text/event-stream")
+
+def _message_text(message: Dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+async def _retrieve(request: Request, options: RagChatOptions, query: str) -> Optional[List[Dict]]:
+    """
+    Hits from the RAG service, over the pooled internal connection. None if it failed.
+    """
+    payload = {"query": query, "top_k": options.top_k, "alpha": options.alpha, "collection_name": options.collection_name}
+    if options.collection_names:
+        payload["collection_names"] = options.collection_names
+    start = time.perf_counter()
+    try:
+        async with request.app.state.upstream_clients.lease(settings.RAG_SERVICE_URL) as client:
+            res = await client.post(
+                f"{settings.RAG_SERVICE_URL.rstrip('/')}/api/v1/rag/query",
+                json=payload,
+                headers={"X-Request-ID": current_request_id() or ""},
+                timeout=settings.RAG_QUERY_TIMEOUT
+            )
+        add_span("rag", start, time.perf_counter() - start)
+        merge_server_timing(res.headers.get("server-timing"), "rag", start)
+        res.raise_for_status()
+        return res.json().get("data") or []
+    except Exception as e:
+        print(f"RAG query failed, answering without knowledge base context: {e}")
+        return None
+
+def _with_context(messages: List[Dict], hits: Optional[List[Dict]]) -> List[Dict]:
+    """
+    Appends the retrieved chunks to the system message, in the format the chat page used to
+    build itself.
+    """
+    if hits is None:
+        # 检索失败时退回基础模型
+        return messages
+    if hits:
+        context = "\n\n=== 检索到的本地知识库信息 ===\n" + "---\n".join(
+            f"[引用 {i + 1}] (溯源: {(hit.get('metadata') or {}).get('source') or 'Unknown'})\n{hit['content']}\n"
+            for i, hit in enumerate(hits)
+        )
+    else:
+        context = "\n\n=== 系统提示 ===\n未在知识库中检索到强相关信息，请基于自身知识谨慎作答，或直接告知用户未找到相关参考。"
+    messages = list(messages)
+    if messages and messages[0].get("role") == "system" and isinstance(messages[0].get("content"), str):
+        messages[0] = {**messages[0], "content": messages[0]["content"] + context}
+    else:
+        messages.insert(0, {"role": "system", "content": context.lstrip()})
+    return messages
+
+@router.post("/chat/rag")
+async def rag_chat_completions(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    知识库增强对话：检索、拼装 Prompt 与流式回答在一次请求内完成。
+    Body is a chat completions request plus `rag` (RagChatOptions). The stream starts with an
+    `event: citations` SSE event listing the chunks the answer is grounded on (`error` is set
+    if retrieval failed and the model answers without them), followed by the model's chunks.
+    """
+    body = await request.json()
+    try:
+        options = RagChatOptions(**(body.pop("rag", None) or {}))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    messages = body.get("messages") or []
+    query = options.query
+    if not query:
+        query = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="No question to search the knowledge base for")
+
+    hits = await _retrieve(request, options, query)
+    body["messages"] = _with_context(messages, hits)
+    citations = [{
+        "index": i + 1,
+        "source": (hit.get("metadata") or {}).get("source") or "Unknown",
+        "collection": hit.get("collection", options.collection_name),
+        "score": hit.get("rerank_score", hit.get("score")),
+        "snippet": hit["content"][:200]
+    } for i, hit in enumerate(hits or [])]
+    active_key, active_base_url = _provider(request)
+
+    async def rag_stream():
+        event = {"citations": citations, "error": "retrieval_failed" if hits is None else None}
+        yield f"event: citations\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        answer = proxy_stream(request, active_key, active_base_url, body) if active_key else mock_stream()
+        async for chunk in answer:
+            yield chunk
 
-    return StreamingResponse(proxy_stream(), media_type="text/event-stream")
+    return StreamingResponse(rag_stream(), media_type="text/event-stream")
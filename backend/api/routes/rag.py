@@ -1,6 +1,5 @@
 import os
 import uuid
-import shutil
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,6 +10,7 @@ from database import get_db
 from models.all_models import KnowledgeBase, Document, User
 from schemas.all_schemas import KBCreate, KBResponse, DocumentResponse
 from api.deps import get_current_user
+from shared.uploads import save_upload, UploadTooLarge
 
 router = APIRouter()
 
@@ -52,18 +52,20 @@ async def upload_document(
         raise HTTPException(status_code=404, detail="Knowledge base not found")
         
     # 安全：采用UUID命名落盘防止路径穿越攻击 ../
-    unique_filename = f"{uuid.uuid4()}_{file.filename}"
-    upload_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
+    unique_filename = f"{uuid.uuid4()}_{os.path.basename(file.filename)}"
     
-    with open(upload_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 分块流式落盘，不阻塞事件循环，内存占用与文件大小无关
+    try:
+        stored = await save_upload(file, settings.UPLOAD_DIR, unique_filename, settings.MAX_UPLOAD_MB * 1024 * 1024)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
         
     doc = Document(
         kb_id=kb.id,
         filename=file.filename,
         unique_name=unique_filename,
         file_type=file.content_type,
-        file_size=os.path.getsize(upload_path),
+        file_size=stored.size,
         status="ready" 
         # 此处预留 processing 状态供后续异步 RAG 索引队列使用
     )
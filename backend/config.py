@@ -18,10 +18,29 @@ class Settings(BaseSettings):
     # AI Config
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+    # Upstream HTTP clients: one keep-alive pool per LLM origin (BYOK ones included), closed
+    # after LLM_POOL_IDLE_SECONDS unused, at most LLM_MAX_POOLS kept
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "1") == "1"
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE: int = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+    LLM_POOL_IDLE_SECONDS: float = float(os.getenv("LLM_POOL_IDLE_SECONDS", "300"))
+    LLM_MAX_POOLS: int = int(os.getenv("LLM_MAX_POOLS", "32"))
     
     # RAG Settings
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./data/uploads")
+    MAX_UPLOAD_MB: int = int(os.getenv("MAX_UPLOAD_MB", "100"))
     VECTOR_DB_DIR: str = os.getenv("VECTOR_DB_DIR", "./data/vector_db")
+    # Local RAG microservice, queried by the server-side RAG chat endpoint
+    RAG_SERVICE_URL: str = os.getenv("RAG_SERVICE_URL", "http://127.0.0.1:8500")
+    RAG_QUERY_TIMEOUT: float = float(os.getenv("RAG_QUERY_TIMEOUT", "10"))
+
+    # Tracing: requests slower than this (ms, 0 = off) are appended with all their spans to TRACE_FILE
+    TRACE_SLOW_MS: float = float(os.getenv("TRACE_SLOW_MS", "0"))
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "./data/traces/slow_traces.jsonl")
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class UpstreamClients:
+    """
+    App-lifetime httpx clients, one keep-alive pool per upstream origin (scheme, host, port),
+    so chat turns reuse TCP/TLS connections instead of paying a fresh handshake each time.
+    BYOK base URLs get pools of their own; at most `max_pools` are kept (least recently used
+    goes first), and a pool unused for `idle_seconds` is closed by `evict_idle`. Pools are
+    only closed while no request holds a lease on them.
+    """
+
+    def __init__(self, http2: bool = True, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, connect_timeout: float = 10.0, read_timeout: float = 60.0,
+                 idle_seconds: float = 300.0, max_pools: int = 32):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("HTTP/2 for upstream clients needs the h2 package (httpx[http2]), using HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.idle_seconds = idle_seconds
+        self.max_pools = max_pools
+        self._pools: "OrderedDict[str, _Pool]" = OrderedDict()  # LRU order
+        self._evict_task: Optional[asyncio.Task] = None
+
+    def _key(self, url: str) -> str:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return f"{parts.scheme}://{parts.hostname}:{port}"
+
+    @asynccontextmanager
+    async def lease(self, url: str) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        The pooled client for `url`'s origin, kept open for the duration of the block.
+        """
+        key = self._key(url)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _Pool(httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout))
+            await self._evict_overflow()
+        else:
+            self._pools.move_to_end(key)
+        pool.leases += 1
+        try:
+            yield pool.client
+        finally:
+            pool.leases -= 1
+            pool.last_used = time.monotonic()
+            if pool.evicted and not pool.leases:
+                await pool.client.aclose()
+
+    async def _drop(self, key: str):
+        pool = self._pools.pop(key)
+        # A pool still in use is closed when its last lease ends
+        pool.evicted = True
+        if not pool.leases:
+            await pool.client.aclose()
+
+    async def _evict_overflow(self):
+        while len(self._pools) > self.max_pools:
+            await self._drop(next(iter(self._pools)))
+
+    async def evict_idle(self):
+        now = time.monotonic()
+        for key, pool in list(self._pools.items()):
+            if not pool.leases and now - pool.last_used > self.idle_seconds:
+                await self._drop(key)
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(self.idle_seconds / 2, 1.0))
+            await self.evict_idle()
+
+    def start(self):
+        self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def aclose(self):
+        if self._evict_task:
+            self._evict_task.cancel()
+        for key in list(self._pools):
+            await self._pools.pop(key).client.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "http2": self.http2,
+            "pools": {key: {"leases": pool.leases} for key, pool in self._pools.items()},
+        }
+
+
+class _Pool:
+    __slots__ = ("client", "leases", "last_used", "evicted")
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.evicted = False
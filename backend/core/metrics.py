@@ -0,0 +1,43 @@
+import contextvars
+from typing import List, Optional
+
+from shared.metrics import Histogram
+
+HTTP_REQUEST_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request",
+                                    ("route",), buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+
+# Per-request statement counter; a one-element list so the SQLAlchemy hook, which runs in
+# SQLAlchemy's greenlet sharing the request's context, mutates it in place
+_db_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("db_queries", default=None)
+
+
+def count_db_query(*args):
+    """
+    SQLAlchemy `before_cursor_execute` listener. Statements outside a request (startup,
+    background work) are not counted.
+    """
+    counter = _db_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class DbQueryMetricsMiddleware:
+    """
+    ASGI middleware recording how many SQL statements each request ran, by route template.
+    Requests that match no route are grouped under "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = [0]
+        token = _db_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _db_queries.reset(token)
+            HTTP_REQUEST_DB_QUERIES.observe(queries[0], getattr(scope.get("route"), "path", "unmatched"))
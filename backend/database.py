@@ -1,6 +1,8 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from config import settings
+from core.metrics import count_db_query
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -9,6 +11,9 @@ engine = create_async_engine(
     connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
 )
 
+# Per-request SQL statement counts for /metrics
+event.listen(engine.sync_engine, "before_cursor_execute", count_db_query)
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -1,3 +1,4 @@
+import os
 import sys
 import io
 
@@ -5,20 +6,40 @@ if sys.platform == "win32":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
 
+# Modules shared with the RAG service live in <repo>/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from config import settings
 from database import init_db, close_db
 from api.routes import api_router
+from shared.metrics import REGISTRY, CONTENT_TYPE, RequestMetricsMiddleware
+from core.metrics import DbQueryMetricsMiddleware
+from shared.tracing import TracingMiddleware
+from core.http_clients import UpstreamClients
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Initializing Database...")
     await init_db()
     print("✅ Database Initialized")
+    app.state.upstream_clients = UpstreamClients(
+        http2=settings.LLM_HTTP2,
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+        read_timeout=settings.LLM_READ_TIMEOUT,
+        idle_seconds=settings.LLM_POOL_IDLE_SECONDS,
+        max_pools=settings.LLM_MAX_POOLS
+    )
+    app.state.upstream_clients.start()
     yield
+    await app.state.upstream_clients.aclose()
     print("🔄 Closing Database Connection...")
     await close_db()
     print("✅ Database Closed")
@@ -35,7 +56,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
+app.add_middleware(DbQueryMetricsMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(TracingMiddleware, service="backend", slow_ms=settings.TRACE_SLOW_MS, trace_file=settings.TRACE_FILE)
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -47,6 +72,10 @@ async def root():
         "status": "online"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -109,3 +109,11 @@ class DocumentResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+# --- RAG Chat ---
+class RagChatOptions(BaseModel):
+    query: Optional[str] = None  # defaults to the text of the last user message
+    collection_name: str = "default"
+    collection_names: Optional[List[str]] = None  # federated search across several collections
+    top_k: int = Field(3, ge=1, le=20)
+    alpha: float = Field(0.5, ge=0.0, le=1.0)
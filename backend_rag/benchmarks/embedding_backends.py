@@ -0,0 +1,80 @@
+"""
+Compares embedding backends against the PyTorch reference: encode throughput, vector
+agreement and retrieval recall.
+
+Queries are the first sentence of sampled chunks; recall@k is the overlap between each
+backend's top-k neighbours and the PyTorch top-k over the same corpus.
+
+Run from backend_rag/:
+    python -m benchmarks.embedding_backends path/to/notes.pdf --models BAAI/bge-small-zh-v1.5
+"""
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from core.embedding_backends import EMBEDDING_BACKENDS, create_embedding_function
+from core.model_manager import RECOMMENDED_MODELS
+from loaders.document_parser import process_file
+
+
+def encode(embedding_fn, texts, batch_size: int):
+    vectors = []
+    t0 = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedding_fn(texts[start:start + batch_size]))
+    elapsed = time.perf_counter() - t0
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12), elapsed
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def first_sentence(text: str) -> str:
+    return re.split(r"(?<=[。！？.!?])\s*", text.strip(), maxsplit=1)[0][:200]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="Document used as the corpus (any format process_file supports)")
+    parser.add_argument("--models", nargs="+", default=[m["id"] for m in RECOMMENDED_MODELS])
+    parser.add_argument("--backends", nargs="+", default=[b for b in EMBEDDING_BACKENDS if b != "torch"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    corpus = [c.content for c in process_file(args.file)]
+    if not corpus:
+        raise SystemExit(f"No text extracted from {args.file}")
+    random.seed(0)
+    queries = [first_sentence(t) for t in random.sample(corpus, min(args.queries, len(corpus)))]
+    k = min(args.k, len(corpus))
+    print(f"{len(corpus)} chunks, {len(queries)} queries, recall@{k}")
+
+    for model in args.models:
+        print(f"\n{model}")
+        results = {}
+        for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+            embedding_fn = create_embedding_function(model, backend)
+            # Warm-up outside the timed region (session creation, first-call allocations)
+            embedding_fn(corpus[:args.batch_size])
+            doc_vectors, elapsed = encode(embedding_fn, corpus, args.batch_size)
+            query_vectors, _ = encode(embedding_fn, queries, args.batch_size)
+            results[backend] = (doc_vectors, elapsed, top_k(query_vectors, doc_vectors, k))
+
+        ref_vectors, ref_elapsed, ref_hits = results["torch"]
+        print(f"  {'backend':<10} {'chunks/s':>9} {'speedup':>8} {'cosine':>7} {'recall':>7}")
+        for backend, (vectors, elapsed, hits) in results.items():
+            cosine = float(np.mean(np.sum(vectors * ref_vectors, axis=1)))
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(hits, ref_hits)])
+            print(f"  {backend:<10} {len(corpus) / elapsed:9.1f} {ref_elapsed / elapsed:7.2f}x {cosine:7.4f} {recall:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+"""
+Offline benchmark suite for HybridRetriever: ingest throughput, per-stage query latency,
+startup time and peak RSS on synthetic Chinese/English corpora, with a deterministic
+hashed bag-of-words embedding instead of a model, so it needs no network and no GPU.
+
+Every corpus size runs in fresh processes (one to build the index, one to open it and
+query it), so startup and peak RSS are measured cold. Results are written as JSON; compare
+two runs (e.g. before and after a change) with `compare`.
+
+Run from backend_rag/:
+    python -m benchmarks.rag_suite run --sizes 1000,10000,100000 --lang mixed
+    python -m benchmarks.rag_suite run --sizes 1000000 --dense-store mmap --queries 500
+    python -m benchmarks.rag_suite compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import os
+
+# The fake embedding has no tokenizer to download; keep transformers from trying
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import hashlib
+import json
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import jieba
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+# The retriever imports modules shared with the backend from <repo>/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from core.retriever import HybridRetriever
+from loaders.base import DocumentChunk
+
+COLLECTION = "bench"
+CHUNKS_PER_SOURCE = 100
+BLOCK_SIZE = 1000
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    """
+    Deterministic stand-in for a sentence-transformers model: a signed hashed bag of
+    English words and Chinese characters, L2-normalized. Texts sharing words land close
+    together, so dense results are meaningful enough to exercise fusion.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input):
+        out = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in _TOKEN_RE.findall(text.lower()):
+                h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            out.append(vector / norm if norm else vector)
+        return out
+
+    @staticmethod
+    def name() -> str:
+        return "rag-benchmark-fake"
+
+    def get_config(self) -> Dict:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "FakeEmbeddingFunction":
+        return FakeEmbeddingFunction(config.get("dim", 384))
+
+
+class SyntheticCorpus:
+    """
+    Deterministic textbook-like chunks. Words are drawn from a Zipf distribution over fixed
+    vocabularies, so term statistics look like natural text to BM25. "zh" chunks are runs
+    of the most frequent words of jieba's own dictionary with Chinese punctuation, "en"
+    chunks are sentences of synthetic space-separated words and "mixed" chunks are Chinese
+    with English terms mixed in.
+    Chunk i is the same for a given seed no matter how many chunks are generated.
+    """
+
+    def __init__(self, lang: str = "mixed", seed: int = 0, vocab_size: int = 20000,
+                 min_words: int = 40, max_words: int = 160):
+        if lang not in ("zh", "en", "mixed"):
+            raise ValueError("lang must be zh, en or mixed")
+        self.lang = lang
+        self.seed = seed
+        self.min_words = min_words
+        self.max_words = max_words
+        rng = np.random.default_rng(seed)
+        # Real words segment like real text; random characters would all go through
+        # jieba's (much slower) unknown-word path
+        jieba.initialize()
+        freq = jieba.dt.FREQ
+        zh = [w for w, f in freq.items() if f > 0 and all("\u4e00" <= c <= "\u9fff" for c in w)]
+        self.zh_words = sorted(zh, key=lambda w: (-freq[w], w))[:vocab_size]
+        syllables = np.array([c + v for c in "bcdfghklmnprstvz" for v in "aeiou"])
+        self.en_words = ["".join(rng.choice(syllables, n)) for n in rng.integers(1, 4, vocab_size)]
+        weights = np.arange(1, min(len(self.zh_words), vocab_size) + 1, dtype=np.float64) ** -1.07
+        self._cdf = np.cumsum(weights / weights.sum())
+
+    def _draw(self, rng, vocab: List[str], n: int) -> List[str]:
+        idx = np.minimum(np.searchsorted(self._cdf, rng.random(n)), len(self._cdf) - 1)
+        return [vocab[i] for i in idx]
+
+    def _chunk(self, rng) -> Tuple[str, List[str]]:
+        n = int(rng.integers(self.min_words, self.max_words))
+        if self.lang == "en":
+            words = self._draw(rng, self.en_words, n)
+            sentences = [" ".join(words[i:i + 12]) for i in range(0, n, 12)]
+            return ". ".join(s.capitalize() for s in sentences) + ".", words
+        words = self._draw(rng, self.zh_words, n)
+        if self.lang == "mixed":
+            english = rng.random(n) < 0.1
+            terms = self._draw(rng, self.en_words, int(english.sum()))
+            for i, term in zip(np.flatnonzero(english), terms):
+                words[i] = f" {term} "
+        clauses = ["".join(words[i:i + 8]) for i in range(0, n, 8)]
+        return "，".join(clauses) + "。", words
+
+    def block(self, block_idx: int) -> List[Tuple[str, List[str]]]:
+        rng = np.random.default_rng([self.seed, block_idx])
+        return [self._chunk(rng) for _ in range(BLOCK_SIZE)]
+
+    def chunks(self, n: int) -> Iterator[Tuple[int, str]]:
+        for block_idx in range(0, (n + BLOCK_SIZE - 1) // BLOCK_SIZE):
+            for offset, (text, _) in enumerate(self.block(block_idx)):
+                i = block_idx * BLOCK_SIZE + offset
+                if i >= n:
+                    return
+                yield i, text
+
+    def queries(self, n_chunks: int, n_queries: int) -> List[str]:
+        """
+        Short spans (3-6 words) of randomly picked chunks, like a student's question terms.
+        """
+        rng = np.random.default_rng([self.seed, 1 << 30])
+        picks = sorted(int(i) for i in rng.integers(0, n_chunks, n_queries))
+        queries = []
+        cached_block, block = None, None
+        for i in picks:
+            if i // BLOCK_SIZE != cached_block:
+                cached_block = i // BLOCK_SIZE
+                block = self.block(cached_block)
+            words = block[i % BLOCK_SIZE][1]
+            length = int(rng.integers(3, 7))
+            start = int(rng.integers(0, max(1, len(words) - length)))
+            span = words[start:start + length]
+            queries.append(" ".join(span) if self.lang == "en" else " ".join("".join(span).split()))
+        order = rng.permutation(len(queries))
+        return [queries[i] for i in order]
+
+
+def peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return int(peak if sys.platform == "darwin" else peak * 1024)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return int(getattr(info, "peak_wset", 0) or info.rss)
+    except ImportError:
+        return None
+
+
+def dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def percentiles(samples_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+    }
+
+
+def open_retriever(args) -> HybridRetriever:
+    # Caches off: every query pays for every stage
+    return HybridRetriever(
+        embed_model_name=FakeEmbeddingFunction.name(),
+        db_path=args.db,
+        query_cache_size=0,
+        result_cache_size=0,
+        memory_budget_mb=1 << 20,
+        dense_store=args.dense_store,
+        dense_dtype=args.dense_dtype,
+        dense_ivf_min_rows=args.dense_ivf_min_rows,
+        embedding_fn=FakeEmbeddingFunction(args.dim),
+    )
+
+
+def build(args) -> Dict:
+    """
+    Ingests `size` synthetic chunks through add_documents, one source file per
+    CHUNKS_PER_SOURCE chunks, in batches of at most --ingest-batch chunks (like the ingest queue).
+    """
+    corpus = SyntheticCorpus(args.lang, args.seed)
+    t0 = time.perf_counter()
+    retriever = open_retriever(args)
+    retriever.create_collection(COLLECTION)
+    startup = time.perf_counter() - t0
+
+    totals = {"added": 0, "embeddings_computed": 0}
+    batch: List[DocumentChunk] = []
+    source = None
+    generate_s = 0.0
+    t0 = time.perf_counter()
+    t_gen = time.perf_counter()
+
+    def flush():
+        stats = retriever.add_documents(batch, source, COLLECTION)
+        for key in totals:
+            totals[key] += stats[key]
+        batch.clear()
+
+    for i, text in corpus.chunks(args.size):
+        generate_s += time.perf_counter() - t_gen
+        chunk_source = f"doc-{i // CHUNKS_PER_SOURCE:06d}.txt"
+        if batch and (chunk_source != source or len(batch) >= args.ingest_batch):
+            flush()
+        source = chunk_source
+        batch.append(DocumentChunk(content=text, metadata={"source": source}))
+        t_gen = time.perf_counter()
+    if batch:
+        flush()
+    ingest_s = time.perf_counter() - t0 - generate_s
+    retriever.close()
+    return {
+        "ingest": {
+            "chunks": totals["added"],
+            "seconds": round(ingest_s, 3),
+            "chunks_per_second": round(totals["added"] / ingest_s, 2) if ingest_s else 0.0,
+            "corpus_generation_seconds": round(generate_s, 3),
+            "empty_startup_seconds": round(startup, 4),
+            "peak_rss_bytes": peak_rss_bytes(),
+        },
+        "disk_bytes": dir_bytes(args.db),
+    }
+
+
+def query(args) -> Dict:
+    """
+    Opens the built index cold and times each query stage the way search() runs them
+    (tokenize, embed, dense leg, sparse leg, fusion), plus search() end to end.
+    """
+    corpus = SyntheticCorpus(args.lang, args.seed)
+    queries = corpus.queries(args.size, args.queries + args.warmup)
+
+    t0 = time.perf_counter()
+    retriever = open_retriever(args)
+    startup = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    state = retriever._snapshot(COLLECTION)
+    load = time.perf_counter() - t0
+    if state is None:
+        raise SystemExit(f"Collection {COLLECTION} missing in {args.db}")
+    rss_after_load = peak_rss_bytes()
+
+    n_candidates = min(args.top_k * 2, len(state[2]))
+    stages = {name: [] for name in ("tokenize", "embed", "dense", "sparse", "fuse", "total", "search")}
+    hits_found = 0
+    for n, q in enumerate(queries):
+        q = retriever._normalize_query(q)
+        t0 = time.perf_counter()
+        tokens = retriever._tokenize(q)
+        t1 = time.perf_counter()
+        embedding = retriever.embedding_fn([q])[0]
+        t2 = time.perf_counter()
+        dense_hits = retriever._dense_leg(COLLECTION, state, q, n_candidates, embedding)
+        t3 = time.perf_counter()
+        sparse_hits = retriever._sparse_leg(state, q, n_candidates, tokens)
+        t4 = time.perf_counter()
+        fused = sorted(retriever._fuse(dense_hits, sparse_hits, args.alpha, args.fusion), key=lambda x: x["score"], reverse=True)[:args.top_k]
+        t5 = time.perf_counter()
+        retriever.search(q, top_k=args.top_k, alpha=args.alpha, collection_name=COLLECTION, fusion=args.fusion)
+        t6 = time.perf_counter()
+        if n < args.warmup:
+            continue
+        hits_found += bool(fused)
+        for name, seconds in (("tokenize", t1 - t0), ("embed", t2 - t1), ("dense", t3 - t2), ("sparse", t4 - t3),
+                              ("fuse", t5 - t4), ("total", t5 - t0), ("search", t6 - t5)):
+            stages[name].append(seconds)
+    retriever.close()
+
+    measured = len(queries) - args.warmup
+    return {
+        "startup": {
+            "open_seconds": round(startup, 4),
+            "collection_load_seconds": round(load, 4),
+            "rss_after_load_bytes": rss_after_load,
+        },
+        "query": {
+            "queries": measured,
+            "answered": hits_found,
+            "stages": {name: percentiles(samples) for name, samples in stages.items() if samples},
+            "queries_per_second": round(measured / sum(stages["search"]), 2) if stages["search"] else 0.0,
+            "peak_rss_bytes": peak_rss_bytes(),
+        },
+    }
+
+
+def _child_args(args, db: str, result: str) -> List[str]:
+    return [
+        "--db", db, "--result", result, "--size", str(args.size), "--lang", args.lang, "--seed", str(args.seed),
+        "--dense-store", args.dense_store, "--dense-dtype", args.dense_dtype,
+        "--dense-ivf-min-rows", str(args.dense_ivf_min_rows), "--dim", str(args.dim),
+        "--ingest-batch", str(args.ingest_batch), "--queries", str(args.queries), "--warmup", str(args.warmup),
+        "--top-k", str(args.top_k), "--alpha", str(args.alpha), "--fusion", args.fusion,
+    ]
+
+
+def _run_child(phase: str, args, db: str) -> Dict:
+    fd, result = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        cmd = [sys.executable, "-m", "benchmarks.rag_suite", phase] + _child_args(args, db, result)
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if proc.returncode != 0:
+            print(proc.stdout)
+            raise SystemExit(f"{phase} failed for size {args.size}")
+        with open(result, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(result)
+
+
+def _git_info() -> Dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def run(args):
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = {
+        "suite": "rag",
+        "format_version": 1,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": _git_info(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {key: getattr(args, key) for key in ("lang", "seed", "dense_store", "dense_dtype", "dense_ivf_min_rows",
+                                                      "dim", "ingest_batch", "queries", "warmup", "top_k", "alpha", "fusion")},
+        "results": [],
+    }
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+    for size in sizes:
+        args.size = size
+        db = tempfile.mkdtemp(prefix=f"rag-bench-{size}-", dir=args.work_dir)
+        try:
+            print(f"[{size} chunks] building...")
+            built = _run_child("build", args, db)
+            print(f"[{size} chunks] {built['ingest']['chunks_per_second']:.0f} chunks/s, querying...")
+            queried = _run_child("query", args, db)
+            result = {"size": size, **built, **queried}
+            report["results"].append(result)
+            stages = result["query"]["stages"]
+            print(f"[{size} chunks] open {result['startup']['open_seconds'] + result['startup']['collection_load_seconds']:.2f} s, "
+                  f"search p50 {stages['search']['p50_ms']:.2f} ms / p99 {stages['search']['p99_ms']:.2f} ms "
+                  f"(dense p50 {stages['dense']['p50_ms']:.2f}, sparse p50 {stages['sparse']['p50_ms']:.2f}), "
+                  f"peak RSS {(result['query']['peak_rss_bytes'] or 0) / 2**20:.0f} MB")
+        finally:
+            shutil.rmtree(db, ignore_errors=True)
+
+    out = args.out
+    if os.path.isdir(out) or not out.endswith(".json"):
+        os.makedirs(out, exist_ok=True)
+        commit = (report["git"]["commit"] or "nogit")[:10]
+        out = os.path.join(out, f"rag-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {out}")
+
+
+def _flatten(value, prefix: str, out: Dict[str, float]):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(item, f"{prefix}.{key}" if prefix else key, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+
+
+def compare(args):
+    """
+    Prints every metric of two result files side by side. Metrics ending in per_second are
+    better when higher, all others (times, bytes) when lower; changes for the worse beyond
+    --threshold percent are flagged and make the exit status 1.
+    """
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    if base["config"] != new["config"]:
+        print("Warning: the runs used different configurations")
+    metrics_base, metrics_new = {}, {}
+    for result in base["results"]:
+        _flatten({k: v for k, v in result.items() if k != "size"}, f"{result['size']}", metrics_base)
+    for result in new["results"]:
+        _flatten({k: v for k, v in result.items() if k != "size"}, f"{result['size']}", metrics_new)
+
+    print(f"base {base['git'].get('commit')}  ->  new {new['git'].get('commit')}")
+    regressions = 0
+    for key in sorted(set(metrics_base) & set(metrics_new), key=lambda k: (int(k.split(".")[0]), k)):
+        old, cur = metrics_base[key], metrics_new[key]
+        if key.endswith(("queries", "answered", ".chunks")):
+            continue
+        change = (cur - old) / old * 100.0 if old else 0.0
+        worse = -change if key.endswith("per_second") else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<55} {old:>14.4f} {cur:>14.4f} {change:>+8.1f}%{flag}")
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold:.0f}%")
+        sys.exit(1)
+
+
+def _add_corpus_args(parser):
+    parser.add_argument("--lang", choices=("zh", "en", "mixed"), default="mixed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dense-store", choices=("chroma", "mmap"), default="chroma")
+    parser.add_argument("--dense-dtype", choices=("float16", "int8"), default="float16")
+    parser.add_argument("--dense-ivf-min-rows", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=384, help="fake embedding dimension")
+    parser.add_argument("--ingest-batch", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--fusion", choices=("weighted", "rrf"), default="weighted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark one or more corpus sizes")
+    run_parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated chunk counts (1k-1M)")
+    run_parser.add_argument("--out", default="benchmarks/results", help="result file (.json) or directory")
+    run_parser.add_argument("--work-dir", default=None, help="where the temporary indexes are built")
+    _add_corpus_args(run_parser)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+
+    # Phases of `run`, each in its own process
+    for phase in ("build", "query"):
+        phase_parser = commands.add_parser(phase)
+        phase_parser.add_argument("--db", required=True)
+        phase_parser.add_argument("--result", required=True)
+        phase_parser.add_argument("--size", type=int, required=True)
+        _add_corpus_args(phase_parser)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        compare(args)
+    else:
+        result = build(args) if args.command == "build" else query(args)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import chromadb
+import numpy as np
+
+from .naming import validate_collection_name
+
+# Hits are dicts with the chunk "id" (may be None for positional stores), the squared L2
+# "distance" (Chroma's default space) and either "content"/"metadata" for stores that keep
+# the text (Chroma) or the "row" the chunk was added at for stores that only keep vectors.
+
+
+class DenseStore(ABC):
+    """
+    Where HybridRetriever keeps and searches chunk embeddings.
+    """
+
+    # Positional stores keep rows in the order chunks were added, aligned with the
+    # retriever's corpus lists, and return "row" instead of text in their hits.
+    positional = False
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def count(self, collection_name: str) -> int:
+        pass
+
+    @abstractmethod
+    def create_collection(self, collection_name: str):
+        pass
+
+    @abstractmethod
+    def delete_collection(self, collection_name: str):
+        pass
+
+    @abstractmethod
+    def add(self, collection_name: str, ids: List[str], embeddings: Sequence, documents: List[str], metadatas: List[Dict]):
+        pass
+
+    @abstractmethod
+    def delete(self, collection_name: str, ids: List[str], rows: List[int]):
+        """
+        Removes chunks, given both by id and by row (positional stores use the rows).
+        """
+        pass
+
+    @abstractmethod
+    def query(self, collection_name: str, embedding, n_results: int) -> List[Dict[str, Any]]:
+        pass
+
+    def get_all(self, collection_name: str) -> Optional[Tuple[List[str], List[str], List[Dict]]]:
+        """
+        (ids, documents, metadatas) for stores that keep the text, None otherwise.
+        """
+        return None
+
+    def truncate(self, collection_name: str, n_rows: int):
+        """
+        Positional stores drop rows beyond `n_rows` (left over by an interrupted write).
+        """
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class ChromaDenseStore(DenseStore):
+    def __init__(self, path: str, embedding_fn):
+        self.client = chromadb.PersistentClient(path=path)
+        self.embedding_fn = embedding_fn
+
+    def _get(self, collection_name: str):
+        return self.client.get_collection(name=collection_name, embedding_function=self.embedding_fn)
+
+    def list_collections(self) -> List[str]:
+        return [c.name for c in self.client.list_collections()]
+
+    def count(self, collection_name: str) -> int:
+        return self._get(collection_name).count()
+
+    def create_collection(self, collection_name: str):
+        self.client.get_or_create_collection(name=collection_name, embedding_function=self.embedding_fn)
+
+    def delete_collection(self, collection_name: str):
+        try:
+            self.client.delete_collection(name=collection_name)
+        except Exception:
+            pass
+
+    def add(self, collection_name: str, ids: List[str], embeddings: Sequence, documents: List[str], metadatas: List[Dict]):
+        coll = self.client.get_or_create_collection(name=collection_name, embedding_function=self.embedding_fn)
+        coll.add(documents=documents, metadatas=metadatas, ids=ids, embeddings=list(embeddings))
+
+    def delete(self, collection_name: str, ids: List[str], rows: List[int]):
+        if ids:
+            self._get(collection_name).delete(ids=ids)
+
+    def query(self, collection_name: str, embedding, n_results: int) -> List[Dict[str, Any]]:
+        results = self._get(collection_name).query(query_embeddings=[embedding], n_results=n_results)
+        hits = []
+        if results and results['ids'] and results['ids'][0]:
+            for i, doc_id in enumerate(results['ids'][0]):
+                hits.append({
+                    "id": doc_id,
+                    "distance": results['distances'][0][i],
+                    "content": results['documents'][0][i],
+                    "metadata": results['metadatas'][0][i]
+                })
+        return hits
+
+    def get_all(self, collection_name: str) -> Optional[Tuple[List[str], List[str], List[Dict]]]:
+        results = self._get(collection_name).get()
+        return results['ids'], results['documents'], results['metadatas']
+
+
+class _MatrixView:
+    """
+    Read-only view of the committed rows of one collection. Replaced, never mutated, on
+    every write, so a query holding one is unaffected by concurrent appends.
+    """
+
+    def __init__(self, directory: str, meta: Dict):
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        self.dtype = meta["dtype"]
+        self.ivf = meta.get("ivf")
+        self.vectors = self.scales = self.norms = None
+        if self.count and self.dim:
+            store_dtype = np.int8 if self.dtype == "int8" else np.float16
+            self.vectors = np.memmap(os.path.join(directory, f"vectors.{self.dtype}"), dtype=store_dtype, mode="r", shape=(self.count, self.dim))
+            self.norms = np.memmap(os.path.join(directory, "norms.f32"), dtype=np.float32, mode="r", shape=(self.count,))
+            if self.dtype == "int8":
+                self.scales = np.memmap(os.path.join(directory, "scales.f32"), dtype=np.float32, mode="r", shape=(self.count,))
+        self.deleted = np.zeros(self.count, dtype=bool)
+        if meta.get("deleted"):
+            rows = np.load(os.path.join(directory, f"{meta['deleted']}.npy"))
+            self.deleted[rows[rows < self.count]] = True
+        self.n_deleted = int(self.deleted.sum())
+        self.centroids = self.list_rows = self.list_offsets = None
+        if self.ivf:
+            prefix = os.path.join(directory, f"ivf-{self.ivf['generation']:06d}")
+            self.centroids = np.load(prefix + ".centroids.npy")
+            self.list_rows = np.load(prefix + ".rows.npy", mmap_mode="r")
+            self.list_offsets = np.load(prefix + ".offsets.npy")
+
+    def dot(self, query: np.ndarray, rows: Optional[np.ndarray] = None, block: int = 65536) -> np.ndarray:
+        """
+        query . x for every row (or the given rows), decoding the stored type block by block.
+        """
+        if rows is None:
+            out = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, block):
+                out[start:start + block] = self._decode(slice(start, start + block)) @ query
+            return out
+        return self._decode(rows) @ query
+
+    def _decode(self, rows) -> np.ndarray:
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            block *= np.asarray(self.scales[rows])[:, None]
+        return block
+
+    def nbytes(self) -> int:
+        size = 0
+        for arr in (self.vectors, self.scales, self.norms, self.list_rows):
+            if arr is not None:
+                size += arr.nbytes
+        return size
+
+
+class MmapDenseStore(DenseStore):
+    """
+    Native dense store: one directory per collection holding the embeddings as a raw
+    float16 or int8 (per-row scale) matrix that is memory-mapped read-only, so processes
+    serving the same index share one copy in the page cache and nothing is copied to the heap.
+
+    Search is an exact flat scan by default. With `ivf_min_rows`, collections of at least that
+    size also get an IVF index (k-means coarse lists, `nprobe` lists probed per query); rows
+    appended after training are scanned exactly until the collection doubles and the lists
+    are retrained. Deleted rows are tombstoned (deleted-N.npy) and skipped by searches; row
+    numbers never change. meta.json is replaced atomically and is the commit point: rows in
+    the data files beyond its count are ignored and cut off by the next write.
+    """
+
+    positional = True
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str, dtype: str = "float16", ivf_min_rows: int = 0, nprobe: int = 8):
+        if dtype not in ("float16", "int8"):
+            raise ValueError("dtype must be float16 or int8")
+        if nprobe < 1:
+            raise ValueError("nprobe must be at least 1")
+        self.path = path
+        self.dtype = dtype
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._views: Dict[str, _MatrixView] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _dir(self, collection_name: str) -> str:
+        return os.path.join(self.path, validate_collection_name(collection_name))
+
+    def _read_meta(self, collection_name: str) -> Optional[Dict]:
+        meta_path = os.path.join(self._dir(collection_name), "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, collection_name: str, meta: Dict):
+        meta_path = os.path.join(self._dir(collection_name), "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        with self._lock:
+            self._views[collection_name] = _MatrixView(self._dir(collection_name), meta)
+        self._remove_stale_files(collection_name, meta)
+
+    def _remove_stale_files(self, collection_name: str, meta: Dict):
+        # Tombstone and IVF generations the committed meta no longer points to. Writes to a
+        # collection are serialized, so nothing written for an uncommitted meta is in flight.
+        live = {meta.get("deleted")}
+        if meta.get("ivf"):
+            live.add(f"ivf-{meta['ivf']['generation']:06d}")
+        directory = self._dir(collection_name)
+        for f in os.listdir(directory):
+            if f.startswith(("ivf-", "deleted-")) and f.split(".")[0] not in live:
+                try:
+                    os.remove(os.path.join(directory, f))
+                except OSError:
+                    # Still mapped by a query holding the previous view (Windows); retried on the next write
+                    pass
+
+    def _view(self, collection_name: str) -> Optional[_MatrixView]:
+        with self._lock:
+            view = self._views.get(collection_name)
+        if view is None:
+            meta = self._read_meta(collection_name)
+            if meta is None:
+                return None
+            view = _MatrixView(self._dir(collection_name), meta)
+            with self._lock:
+                view = self._views.setdefault(collection_name, view)
+        return view
+
+    def list_collections(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.path) if os.path.exists(os.path.join(self.path, name, "meta.json")))
+
+    def count(self, collection_name: str) -> int:
+        """
+        Rows stored, deleted ones included (they keep their positions).
+        """
+        view = self._view(collection_name)
+        if view is None:
+            raise ValueError(f"Collection {collection_name} does not exist")
+        return view.count
+
+    def delete(self, collection_name: str, ids: List[str], rows: List[int]):
+        meta = self._read_meta(collection_name)
+        if meta is None or not rows:
+            return
+        view = self._view(collection_name)
+        deleted = view.deleted.copy()
+        deleted[[r for r in rows if r < meta["count"]]] = True
+        generation = meta.get("next_deleted", 0)
+        name = f"deleted-{generation:06d}"
+        np.save(os.path.join(self._dir(collection_name), f"{name}.npy"), np.flatnonzero(deleted).astype(np.int32))
+        meta["deleted"] = name
+        meta["next_deleted"] = generation + 1
+        self._write_meta(collection_name, meta)
+
+    def create_collection(self, collection_name: str):
+        if self._read_meta(collection_name) is None:
+            os.makedirs(self._dir(collection_name), exist_ok=True)
+            self._write_meta(collection_name, {"format_version": self.FORMAT_VERSION, "dtype": self.dtype, "dim": 0, "count": 0, "ivf": None})
+
+    def delete_collection(self, collection_name: str):
+        with self._lock:
+            self._views.pop(collection_name, None)
+        shutil.rmtree(self._dir(collection_name), ignore_errors=True)
+
+    def _data_files(self, meta: Dict) -> List[Tuple[str, int]]:
+        # (file name, bytes per row)
+        itemsize = 1 if meta["dtype"] == "int8" else 2
+        files = [(f"vectors.{meta['dtype']}", meta["dim"] * itemsize), ("norms.f32", 4)]
+        if meta["dtype"] == "int8":
+            files.append(("scales.f32", 4))
+        return files
+
+    def truncate(self, collection_name: str, n_rows: int):
+        meta = self._read_meta(collection_name)
+        if meta is None or meta["count"] <= n_rows:
+            return
+        meta["count"] = n_rows
+        if meta["ivf"] and meta["ivf"]["trained_rows"] > n_rows:
+            meta["ivf"] = None
+        self._write_meta(collection_name, meta)
+        self._cut_uncommitted(collection_name, meta)
+
+    def _cut_uncommitted(self, collection_name: str, meta: Dict):
+        for name, row_bytes in self._data_files(meta):
+            file_path = os.path.join(self._dir(collection_name), name)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > meta["count"] * row_bytes:
+                with open(file_path, "r+b") as f:
+                    f.truncate(meta["count"] * row_bytes)
+
+    def add(self, collection_name: str, ids: List[str], embeddings: Sequence, documents: List[str], metadatas: List[Dict]):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(vectors):
+            return
+        self.create_collection(collection_name)
+        meta = self._read_meta(collection_name)
+        if not meta["dim"]:
+            meta["dim"] = vectors.shape[1]
+        elif meta["dim"] != vectors.shape[1]:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {meta['dim']}")
+        # Drop anything an interrupted write left past the committed rows before appending
+        self._cut_uncommitted(collection_name, meta)
+
+        directory = self._dir(collection_name)
+        norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+        if meta["dtype"] == "int8":
+            scales = (np.abs(vectors).max(axis=1) / 127.0).astype(np.float32)
+            scales[scales == 0] = 1.0
+            stored = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            with open(os.path.join(directory, "scales.f32"), "ab") as f:
+                f.write(scales.tobytes())
+        else:
+            stored = vectors.astype(np.float16)
+        with open(os.path.join(directory, f"vectors.{meta['dtype']}"), "ab") as f:
+            f.write(stored.tobytes())
+        with open(os.path.join(directory, "norms.f32"), "ab") as f:
+            f.write(norms.tobytes())
+
+        meta["count"] += len(vectors)
+        if self.ivf_min_rows and meta["count"] >= self.ivf_min_rows:
+            trained = meta["ivf"]["trained_rows"] if meta["ivf"] else 0
+            if meta["count"] >= 2 * trained:
+                meta["ivf"] = self._train_ivf(collection_name, meta)
+        self._write_meta(collection_name, meta)
+
+    def _train_ivf(self, collection_name: str, meta: Dict, iterations: int = 10) -> Dict:
+        view = _MatrixView(self._dir(collection_name), {**meta, "ivf": None})
+        n = view.count
+        nlist = int(min(4096, max(16, np.sqrt(n))))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))
+        data = view._decode(sample)
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearest(data, centroids)
+            for c in range(nlist):
+                members = data[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 65536):
+            assign[start:start + 65536] = self._nearest(view._decode(slice(start, start + 65536)), centroids)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+
+        generation = (meta["ivf"]["generation"] + 1) if meta["ivf"] else 1
+        prefix = os.path.join(self._dir(collection_name), f"ivf-{generation:06d}")
+        np.save(prefix + ".centroids.npy", centroids.astype(np.float32))
+        np.save(prefix + ".rows.npy", order)
+        np.save(prefix + ".offsets.npy", offsets)
+        # The previous generation stays readable until the new meta is committed, and is
+        # removed by the write that commits it
+        print(f"Trained IVF index for {collection_name}: {nlist} lists over {n} rows")
+        return {"generation": generation, "nlist": nlist, "trained_rows": n}
+
+    def _nearest(self, data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        dist = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * data @ centroids.T
+        return np.argmin(dist, axis=1)
+
+    def query(self, collection_name: str, embedding, n_results: int) -> List[Dict[str, Any]]:
+        view = self._view(collection_name)
+        if view is None or not view.count or n_results <= 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32)
+        q_norm = float(q @ q)
+
+        rows = None
+        if view.ivf:
+            trained = view.ivf["trained_rows"]
+            nprobe = min(self.nprobe, view.ivf["nlist"])
+            centroid_dist = (view.centroids * view.centroids).sum(axis=1) - 2.0 * view.centroids @ q
+            probe = np.argpartition(centroid_dist, nprobe - 1)[:nprobe]
+            parts = [np.asarray(view.list_rows[view.list_offsets[c]:view.list_offsets[c + 1]]) for c in probe]
+            parts.append(np.arange(trained, view.count, dtype=np.int32))
+            rows = np.sort(np.concatenate(parts))
+            if view.n_deleted:
+                rows = rows[~view.deleted[rows]]
+            if len(rows) < n_results:
+                rows = None
+
+        if rows is None:
+            dist = q_norm + np.asarray(view.norms) - 2.0 * view.dot(q)
+            candidates = np.arange(view.count)
+            if view.n_deleted:
+                live = ~view.deleted
+                dist, candidates = dist[live], candidates[live]
+                if not len(dist):
+                    return []
+        else:
+            dist = q_norm + np.asarray(view.norms[rows]) - 2.0 * view.dot(q, rows)
+            candidates = rows
+
+        k = min(n_results, len(dist))
+        top = np.argpartition(dist, k - 1)[:k] if k < len(dist) else np.arange(len(dist))
+        top = top[np.argsort(dist[top], kind="stable")]
+        return [{"id": None, "row": int(candidates[i]), "distance": max(float(dist[i]), 0.0)} for i in top]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            views = dict(self._views)
+        return {
+            "dtype": self.dtype,
+            "ivf_min_rows": self.ivf_min_rows,
+            "nprobe": self.nprobe,
+            "collections": {name: {"rows": v.count, "deleted": v.n_deleted, "mapped_bytes": v.nbytes(), "ivf": v.ivf} for name, v in views.items()}
+        }
@@ -0,0 +1,110 @@
+import os
+import shutil
+import threading
+from typing import Any, Dict, Tuple
+
+from chromadb.utils import embedding_functions
+
+# "torch" is the sentence-transformers PyTorch path; the ONNX ones run on ONNX Runtime (CPU)
+# and need `optimum[onnxruntime]` plus sentence-transformers >= 3.2.
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Exported (and quantized) models are written here once and reused on every later start
+ONNX_CACHE_DIR = os.environ.get("RAG_ONNX_CACHE_DIR", "./onnx_models")
+# Instruction set targeted by dynamic int8 quantization: arm64, avx2, avx512 or avx512_vnni
+QUANTIZATION_CONFIG = os.environ.get("RAG_ONNX_QUANT_CONFIG", "avx2")
+
+_export_lock = threading.Lock()
+
+
+def _find_onnx_file(model_dir: str) -> str:
+    for candidate in ("onnx/model.onnx", "model.onnx"):
+        if os.path.exists(os.path.join(model_dir, candidate)):
+            return candidate
+    return ""
+
+
+def export_onnx(model_name: str, quantized: bool = False, quantization_config: str = QUANTIZATION_CONFIG,
+                cache_dir: str = ONNX_CACHE_DIR) -> Tuple[str, str]:
+    """
+    Exports `model_name` to ONNX under `cache_dir` (and a dynamically quantized int8 copy when
+    asked), doing the work only the first time. Returns (model_dir, onnx file relative to it).
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+    with _export_lock:
+        fp32_file = _find_onnx_file(model_dir)
+        if not fp32_file:
+            print(f"Exporting {model_name} to ONNX in {model_dir}...")
+            model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+            # Export next to the target and swap in, so an interrupted export is never picked up
+            tmp_dir = model_dir + ".tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            model.save_pretrained(tmp_dir)
+            shutil.rmtree(model_dir, ignore_errors=True)
+            os.replace(tmp_dir, model_dir)
+            fp32_file = _find_onnx_file(model_dir)
+        if not quantized:
+            return model_dir, fp32_file
+
+        int8_file = os.path.join(os.path.dirname(fp32_file), f"model_qint8_{quantization_config}.onnx")
+        if not os.path.exists(os.path.join(model_dir, int8_file)):
+            print(f"Quantizing {model_name} to int8 ({quantization_config})...")
+            model = SentenceTransformer(model_dir, device="cpu", backend="onnx", model_kwargs={"file_name": fp32_file})
+            export_dynamic_quantized_onnx_model(model, quantization_config, model_dir)
+        return model_dir, int8_file
+
+
+class OnnxEmbeddingFunction(embedding_functions.SentenceTransformerEmbeddingFunction):
+    """
+    A sentence-transformers model served by ONNX Runtime from the export cache.
+
+    It keeps the sentence_transformer name and call signature of Chroma's built-in function,
+    so collections created with the PyTorch backend open without an embedding-function
+    conflict. Loaded sessions are shared per exported file.
+    """
+
+    _sessions: Dict[Tuple[str, str], Any] = {}
+
+    def __init__(self, model_name: str, quantized: bool = False, quantization_config: str = QUANTIZATION_CONFIG):
+        from sentence_transformers import SentenceTransformer
+
+        model_dir, file_name = export_onnx(model_name, quantized, quantization_config)
+        self.model_name = model_name
+        self.device = "cpu"
+        self.normalize_embeddings = False
+        self.kwargs = {"backend": "onnx", "model_kwargs": {"file_name": file_name}}
+        key = (model_dir, file_name)
+        if key not in self._sessions:
+            self._sessions[key] = SentenceTransformer(model_dir, device="cpu", backend="onnx", model_kwargs={"file_name": file_name})
+        self._model = self._sessions[key]
+
+
+def create_embedding_function(model_name: str, backend: str = "torch"):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    if backend == "torch":
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+    return OnnxEmbeddingFunction(model_name, quantized=backend == "onnx-int8")
+
+
+def release_embedding_function(model_name: str, backend: str = "torch"):
+    """
+    Drops the process-wide reference to a loaded model so its weights can be freed once no
+    retriever uses it any more.
+    """
+    if backend == "torch":
+        embedding_functions.SentenceTransformerEmbeddingFunction.models.pop(model_name, None)
+        return
+    model_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    for key in [k for k in OnnxEmbeddingFunction._sessions if k[0] == model_dir]:
+        OnnxEmbeddingFunction._sessions.pop(key, None)
+
+
+def embedding_key(model_name: str, backend: str = "torch") -> str:
+    """
+    Identity of the vectors a (model, backend) pair produces, used to key cached embeddings.
+    Quantized vectors differ slightly from fp32 ones, so they are never mixed.
+    """
+    return model_name if backend == "torch" else f"{model_name}#{backend}"
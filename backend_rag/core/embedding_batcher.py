@@ -0,0 +1,122 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Queued by stop() behind every pending request
+_STOP = object()
+
+
+def plan_batches(lengths: Sequence[int], batch_size: int, bucketed: bool = True) -> List[List[int]]:
+    """
+    Groups text indices into encoder batches. The encoder pads every text to the longest in
+    its batch, so with `bucketed` texts are sorted by length first and each batch holds
+    neighbours of similar length; otherwise batches follow arrival order.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i]) if bucketed else list(range(len(lengths)))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def padding_stats(lengths: Sequence[int], batches: List[List[int]]) -> Dict[str, int]:
+    # Real tokens vs tokens actually pushed through the encoder once padding is added
+    tokens = sum(lengths)
+    padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches if batch)
+    return {"batches": len(batches), "texts": len(lengths), "tokens": tokens, "padded_tokens": padded}
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text encode calls into one model call.
+
+    Callers (retriever worker threads) block in `encode`. A background thread takes the
+    first waiting request and encodes it right away if nothing else is queued, so a lone
+    query pays no batching delay. When others are already waiting (concurrent load), it
+    keeps collecting for at most `max_wait_ms` or until `max_batch_size` texts are gathered,
+    encodes them in one batch and hands each caller its own row, so under heavy load the
+    encoder runs full batches instead of one matmul per query.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[Any]], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self._stop_lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="rag-embed-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, text: str) -> Any:
+        future: Future = Future()
+        with self._stop_lock:
+            if self._stopped:
+                raise RuntimeError("Embedding batcher is stopped")
+            self._queue.put((text, future))
+        return future.result()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Encodes the requests already queued, then ends the background thread. Later `encode`
+        calls raise.
+        """
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _collect(self) -> Optional[List]:
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        if self._queue.empty():
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Nothing is queued behind it: encode this batch, stop on the next collect
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Identical questions arriving together are encoded once
+            unique = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                embeddings = self.embed_fn(unique)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            by_text = dict(zip(unique, embeddings))
+            for text, future in batch:
+                future.set_result(by_text[text])
+            self.batches += 1
+            self.texts += len(unique)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize(),
+        }
@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from shared.metrics import Counter, Histogram
+
+# Job lifecycle: queued -> parsing -> embedding -> indexed, or back to queued on a retryable
+# failure and finally failed once max_attempts is used up.
+ACTIVE_STATUSES = ("parsing", "embedding")
+
+INGEST_JOBS = Counter("rag_ingest_jobs_total", "Ingestion job attempts by outcome (indexed, retried, failed)", ("outcome",))
+INGEST_JOB_SECONDS = Histogram("rag_ingest_job_seconds", "Wall time of one ingestion job attempt",
+                               buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    collection_name TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_size INTEGER,
+    content_hash TEXT,
+    mode TEXT NOT NULL DEFAULT 'add',
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    chunks_total INTEGER,
+    chunks_indexed INTEGER NOT NULL DEFAULT 0,
+    stats TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_run_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status ON ingest_jobs (status, next_run_at);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_collection ON ingest_jobs (collection_name, created_at);
+"""
+
+
+class IngestQueue:
+    """
+    Durable document ingestion queue backed by a local SQLite file.
+
+    Jobs survive restarts: anything that was mid-flight when the process died is put back
+    to `queued` on start. A pool of worker threads claims jobs oldest first and runs the
+    `handler(job, update)` callback, where `update(**fields)` records progress (status,
+    chunks_total, chunks_indexed, stats). A handler exception is retried with linear
+    backoff until `max_attempts`, after which the job is marked failed with the error.
+    The queue owns the uploaded file and deletes it once the job is indexed or failed.
+    """
+
+    def __init__(self, db_file: str, handler: Callable[[Dict[str, Any], Callable[..., None]], None],
+                 workers: int = 2, max_attempts: int = 3, retry_delay: float = 5.0):
+        self.db_file = db_file
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._claim_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Columns added after the first release of the table
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(ingest_jobs)")}
+            for column, ddl in (("file_size", "INTEGER"), ("content_hash", "TEXT"), ("mode", "TEXT NOT NULL DEFAULT 'add'")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {column} {ddl}")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the worker threads independent
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        now = time.time()
+        with self._connect() as conn:
+            requeued = conn.execute(
+                f"UPDATE ingest_jobs SET status = 'queued', next_run_at = ?, updated_at = ? "
+                f"WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+                (now, now, *ACTIVE_STATUSES)
+            ).rowcount
+        if requeued:
+            print(f"Re-queued {requeued} interrupted ingestion job(s)")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"rag-ingest-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def submit(self, job_id: str, collection_name: str, filename: str, file_path: str,
+               file_size: Optional[int] = None, content_hash: Optional[str] = None, mode: str = "add") -> Dict[str, Any]:
+        """
+        Queues a file. In "replace" mode the handler swaps out the chunks a previous upload of
+        the same filename left in the collection.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO ingest_jobs (id, collection_name, filename, file_path, file_size, content_hash, mode, "
+                "status, created_at, updated_at, next_run_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, collection_name, filename, file_path, file_size, content_hash, mode, now, now, now)
+            )
+        self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, collection_name: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            if collection_name:
+                rows = conn.execute(
+                    "SELECT * FROM ingest_jobs WHERE collection_name = ? ORDER BY created_at DESC LIMIT ?",
+                    (collection_name, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def depth(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM ingest_jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["stats"] = json.loads(job["stats"]) if job["stats"] else None
+        job.pop("file_path", None)
+        return job
+
+    def _update(self, job_id: str, **fields):
+        if "stats" in fields:
+            fields["stats"] = json.dumps(fields["stats"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        # The lock serializes our own workers; the status guard on the UPDATE keeps another
+        # process sharing the file from claiming the same job.
+        with self._claim_lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM ingest_jobs WHERE status = 'queued' AND next_run_at <= ? ORDER BY created_at LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                "UPDATE ingest_jobs SET status = 'parsing', attempts = attempts + 1, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), row["id"])
+            ).rowcount
+            if not claimed:
+                return None
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+            t0 = time.perf_counter()
+            try:
+                self.handler(job, lambda **fields: self._update(job["id"], **fields))
+                self._update(job["id"], status="indexed")
+                INGEST_JOBS.inc(1, "indexed")
+            except Exception as e:
+                traceback.print_exc()
+                if job["attempts"] < self.max_attempts:
+                    self._update(job["id"], status="queued", error=str(e),
+                                 next_run_at=time.time() + self.retry_delay * job["attempts"])
+                    INGEST_JOBS.inc(1, "retried")
+                    continue
+                self._update(job["id"], status="failed", error=str(e))
+                INGEST_JOBS.inc(1, "failed")
+            finally:
+                INGEST_JOB_SECONDS.observe(time.perf_counter() - t0)
+            if os.path.exists(job["file_path"]):
+                os.remove(job["file_path"])
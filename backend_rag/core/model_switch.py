@@ -0,0 +1,270 @@
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from .embedding_backends import release_embedding_function
+from .retriever import HybridRetriever
+
+# Index data a generation directory holds; the embedding store and the ACTIVE file live at
+# the root and are shared by all generations.
+_INDEX_ENTRIES = ("chroma", "dense", "sparse", "bm25_caches")
+
+
+class IndexGenerations:
+    """
+    Layout of the RAG database root. Each embedding model gets its own generation directory
+    under `generations/`; the ACTIVE file names the one being served, together with its model
+    and backend, and is replaced atomically to cut over. A root without an ACTIVE file is the
+    original single-index layout and is served in place.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.active_file = os.path.join(root, "ACTIVE")
+        os.makedirs(os.path.join(root, "generations"), exist_ok=True)
+
+    def active(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.active_file):
+            return None
+        with open(self.active_file, "r", encoding="utf-8") as f:
+            active = json.load(f)
+        active["path"] = os.path.join(self.root, "generations", active["generation"])
+        return active
+
+    def new_generation(self) -> str:
+        name = f"gen-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        path = os.path.join(self.root, "generations", name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def activate(self, path: str, embed_model_name: str, embedding_backend: str):
+        record = {"generation": os.path.basename(path), "embed_model_name": embed_model_name, "embedding_backend": embedding_backend}
+        with open(self.active_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(self.active_file + ".tmp", self.active_file)
+
+    def remove(self, path: str):
+        if os.path.abspath(path) == os.path.abspath(self.root):
+            # Original layout: drop its index data, keep the shared files and other generations
+            for entry in _INDEX_ENTRIES:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup(self):
+        """
+        Removes generations that are not active (left by a cancelled or interrupted switch).
+        """
+        active = self.active()
+        generations_dir = os.path.join(self.root, "generations")
+        for name in os.listdir(generations_dir):
+            if active is None or name != active["generation"]:
+                shutil.rmtree(os.path.join(generations_dir, name), ignore_errors=True)
+
+
+class ModelSwitch:
+    """
+    Switches the served embedding model without downtime.
+
+    A shadow retriever for the new model is built in a fresh generation directory by
+    re-embedding the chunks the current index already stores (the embedding store makes a
+    switch back to an earlier model nearly free), while the current index keeps serving and
+    accepting uploads. Chunks added meanwhile are picked up by catch-up passes. For the
+    cut-over, writes are frozen, the last chunks are copied, the ACTIVE pointer is swapped
+    and `on_swap(shadow)` installs the new retriever; writes that were waiting are forwarded
+    to it. The old generation is deleted after `grace_seconds`, once in-flight queries drained.
+    """
+
+    def __init__(self, source: HybridRetriever, generations: IndexGenerations,
+                 make_retriever: Callable[[str, str, str], HybridRetriever],
+                 on_swap: Callable[[HybridRetriever], None],
+                 embed_model_name: str, embedding_backend: str,
+                 batch_chunks: int = 256, grace_seconds: float = 30.0):
+        self.source = source
+        self.generations = generations
+        self.make_retriever = make_retriever
+        self.on_swap = on_swap
+        self.batch_chunks = batch_chunks
+        self.grace_seconds = grace_seconds
+        self._cancel = threading.Event()
+        self._copied: Dict[str, int] = {}  # { collection_name: chunks copied }
+        self.status: Dict[str, Any] = {
+            "state": "pending",
+            "from_model": source.embed_model_name,
+            "embed_model_name": embed_model_name,
+            "embedding_backend": embedding_backend,
+            "collections_total": 0,
+            "collections_done": 0,
+            "chunks_total": 0,
+            "chunks_done": 0,
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        self._thread = threading.Thread(target=self._run, name="rag-model-switch", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self.status["state"] in ("pending", "running", "swapping")
+
+    def start(self):
+        self.status["started_at"] = time.time()
+        self.status["state"] = "running"
+        self._thread.start()
+
+    def cancel(self) -> bool:
+        if not self.running or self.status["state"] == "swapping":
+            return False
+        self._cancel.set()
+        return True
+
+    def progress(self) -> Dict[str, Any]:
+        status = dict(self.status)
+        status["percent"] = round(100.0 * status["chunks_done"] / status["chunks_total"], 1) if status["chunks_total"] else 0.0
+        return status
+
+    def _copy_pass(self, shadow: HybridRetriever) -> int:
+        """
+        Copies every chunk not yet in the shadow. Returns how many were copied.
+        """
+        names = [c["name"] for c in self.source.get_collections()]
+        copied = 0
+        totals = {}
+        for name in names:
+            state = self.source._snapshot(name)
+            totals[name] = len(state[1]) if state else 0
+        self.status["collections_total"] = len(names)
+        self.status["chunks_total"] = sum(totals.values())
+
+        for name in names:
+            if name not in self._copied:
+                shadow.create_collection(name)
+                self._copied[name] = 0
+            while self._copied[name] < totals[name]:
+                if self._cancel.is_set():
+                    return copied
+                state = self.source._snapshot(name)
+                if state is None:
+                    break
+                _, ids, chunks, metas = state
+                start = self._copied[name]
+                end = min(start + self.batch_chunks, len(ids))
+                by_source: Dict[str, list] = {}
+                for content, meta in zip(chunks[start:end], metas[start:end]):
+                    if content is None:
+                        # Deleted from the source
+                        continue
+                    meta = dict(meta or {})
+                    by_source.setdefault(meta.get("source", "Unknown"), []).append(_Chunk(content, meta))
+                for source_name, batch in by_source.items():
+                    shadow.add_documents(batch, source_name, name)
+                copied += end - start
+                self._copied[name] = end
+                self.status["chunks_done"] = sum(self._copied.values())
+            totals[name] = self._copied[name]
+        self.status["collections_done"] = len(names)
+
+        # Collections deleted since the previous pass
+        for name in list(self._copied):
+            if name not in names:
+                shadow.delete_collection(name)
+                del self._copied[name]
+        return copied
+
+    def _reconcile(self, shadow: HybridRetriever):
+        """
+        Drops chunks the source deleted after they were copied (single-file deletes and
+        replacements) and carries over what the source manifest knows about each file.
+        Runs with writes frozen.
+        """
+        for name in self._copied:
+            manifest = self.source._load_manifest(name)
+            shadow_manifest = shadow._load_manifest(name)
+            state = self.source._snapshot(name)
+            if manifest is None or shadow_manifest is None or state is None:
+                continue
+            live = None
+            for source_name, entry in list(shadow_manifest["sources"].items()):
+                if entry["chunks"] != manifest["sources"].get(source_name, {}).get("chunks", 0):
+                    if live is None:
+                        live = set(doc_id for doc_id in state[1] if doc_id is not None)
+                    shadow.delete_source(name, source_name, keep_ids=live)
+            for source_name, entry in manifest["sources"].items():
+                info = {key: entry[key] for key in ("file_size", "sha256", "ingested_at", "updated_at") if entry.get(key) is not None}
+                shadow.set_source_info(name, source_name, **info)
+
+    def _run(self):
+        model = self.status["embed_model_name"]
+        backend = self.status["embedding_backend"]
+        shadow = None
+        old_path = self.source.db_path
+        path = self.generations.new_generation()
+        try:
+            print(f"Building shadow index for {model} ({backend}) in {path}...")
+            shadow = self.make_retriever(model, backend, path)
+            self._copy_pass(shadow)
+            # Catch up with uploads that landed during the long pass (bounded, in case uploads
+            # keep coming); whatever is left is copied by the final pass with writes frozen
+            for _ in range(5):
+                if self._cancel.is_set() or not self._copy_pass(shadow):
+                    break
+            if self._cancel.is_set():
+                raise _Cancelled()
+
+            self.status["state"] = "swapping"
+            with self.source.freeze_writes():
+                self._copy_pass(shadow)
+                self._reconcile(shadow)
+                self.generations.activate(path, model, backend)
+                self.source.successor = shadow
+                self.on_swap(shadow)
+            self.status["state"] = "completed"
+            self.status["finished_at"] = time.time()
+            print(f"Switched embedding model to {model} ({backend})")
+        except _Cancelled:
+            self.status["state"] = "cancelled"
+            self.status["finished_at"] = time.time()
+            self._discard(shadow, path)
+            print(f"Model switch to {model} cancelled")
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.status["state"] = "failed"
+            self.status["error"] = str(e)
+            self.status["finished_at"] = time.time()
+            self._discard(shadow, path)
+            return
+        self._retire_source(model, backend, old_path)
+
+    def _retire_source(self, model: str, backend: str, old_path: str):
+        """
+        Closes and deletes the previous index once in-flight queries drained. Only called after
+        a completed cut-over: the new index is live by then, so failures only leave garbage behind.
+        """
+        time.sleep(self.grace_seconds)
+        try:
+            self.source.close()
+            if (self.source.embed_model_name, self.source.embedding_backend) != (model, backend):
+                release_embedding_function(self.source.embed_model_name, self.source.embedding_backend)
+            self.generations.remove(old_path)
+        except Exception:
+            traceback.print_exc()
+
+    def _discard(self, shadow: Optional[HybridRetriever], path: str):
+        if shadow is not None:
+            shadow.close()
+        self.generations.remove(path)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _Chunk:
+    def __init__(self, content: str, metadata: dict):
+        self.content = content
+        self.metadata = metadata
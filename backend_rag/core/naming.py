@@ -0,0 +1,24 @@
+import re
+
+# Chroma's rules for collection names; they also keep a name a single safe path component
+_COLLECTION_NAME_RE = re.compile(r"^[a-zA-Z0-9._-]{3,512}$")
+
+
+class InvalidCollectionName(ValueError):
+    pass
+
+
+def is_valid_collection_name(name: str) -> bool:
+    return isinstance(name, str) and bool(_COLLECTION_NAME_RE.match(name)) and ".." not in name
+
+
+def validate_collection_name(name: str) -> str:
+    """
+    Returns `name` if it may be used as a collection name, which is also a directory name
+    under every index root. Raises InvalidCollectionName otherwise.
+    """
+    if not is_valid_collection_name(name):
+        raise InvalidCollectionName(
+            f"Invalid collection name {name!r}: use 3-512 characters from a-z, A-Z, 0-9, '.', '_' and '-', without '..'"
+        )
+    return name
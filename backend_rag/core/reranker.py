@@ -0,0 +1,134 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from shared.metrics import Histogram
+from shared.tracing import add_span
+
+from .cache import LRUCache, normalize_query
+from .embedding_store import content_hash
+
+RERANK_SECONDS = Histogram("rag_rerank_seconds", "Cross-encoder rerank time per request")
+
+
+class CrossEncoderReranker:
+    """
+    Second retrieval stage: re-scores first-stage candidates with a small local cross-encoder
+    (sentence-transformers CrossEncoder), which reads query and chunk together.
+
+    Candidates are scored in batches in first-stage order and scores are cached per
+    (normalized query, chunk content hash), with the query normalized as for the retriever's
+    result cache. Each call has a latency budget: a batch is only started if it is expected
+    to finish in time, so when the budget runs out the scored prefix is re-ordered and the
+    rest keeps its first-stage order behind it. Until the model has loaded (in the
+    background), calls return the first-stage order unchanged.
+    """
+
+    def __init__(self, model_name: str = "BAAI/bge-reranker-base", batch_size: int = 16,
+                 max_length: int = 512, cache_size: int = 8192):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.score_cache = LRUCache(cache_size)
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._loading = False
+        self._load_error: Optional[str] = None
+        self._batch_seconds = 0.0  # moving average, used to predict whether a batch still fits
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "candidates": 0, "scored": 0, "cached": 0, "budget_exhausted": 0, "not_ready": 0, "seconds": 0.0}
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def load_async(self):
+        with self._load_lock:
+            # A model that failed to load is not retried on every request
+            if self._model is not None or self._loading or self._load_error:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, name="rag-rerank-load", daemon=True).start()
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            print(f"Loading reranker {self.model_name}...")
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+            print(f"Reranker {self.model_name} loaded")
+        except Exception as e:
+            self._load_error = str(e)
+            print(f"Reranker {self.model_name} unavailable, results keep first-stage order: {e}")
+        finally:
+            self._loading = False
+
+    def _predict(self, pairs: List[List[str]]) -> List[float]:
+        t0 = time.perf_counter()
+        scores = self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        elapsed = time.perf_counter() - t0
+        with self._stats_lock:
+            self._batch_seconds = elapsed if not self._batch_seconds else 0.8 * self._batch_seconds + 0.2 * elapsed
+        return [float(s) for s in scores]
+
+    def rerank(self, query: str, hits: List[Dict], top_k: int, budget_ms: float) -> List[Dict]:
+        """
+        Returns the best `top_k` of `hits` (first-stage order), each with a `rerank_score`
+        if it was scored in time.
+        """
+        t0 = time.perf_counter()
+        deadline = t0 + budget_ms / 1000.0
+        hits = [dict(h) for h in hits]
+        if not self.ready:
+            self.load_async()
+            self._count(len(hits), 0, 0, False, not_ready=True, seconds=0.0)
+            return hits[:top_k]
+
+        # Variants of one query get the same first-stage hits from the result cache; score them
+        # as one query too, so they share cache entries and get the same order
+        query = normalize_query(query)
+        keys = [(query, (h.get("metadata") or {}).get("content_hash") or content_hash(h["content"])) for h in hits]
+        scores: List[Optional[float]] = [self.score_cache.get(key) for key in keys]
+        cached = sum(s is not None for s in scores)
+        todo = [i for i, s in enumerate(scores) if s is None]
+        exhausted = False
+        computed = 0
+        for start in range(0, len(todo), self.batch_size):
+            batch = todo[start:start + self.batch_size]
+            if time.perf_counter() + self._batch_seconds * len(batch) / self.batch_size > deadline:
+                exhausted = True
+                break
+            for i, score in zip(batch, self._predict([[query, hits[i]["content"]] for i in batch])):
+                scores[i] = score
+                self.score_cache.put(keys[i], score)
+            computed += len(batch)
+
+        # Only the fully scored prefix is re-ordered; the tail keeps its first-stage order
+        n_scored = next((i for i, s in enumerate(scores) if s is None), len(scores))
+        for hit, score in zip(hits[:n_scored], scores[:n_scored]):
+            hit["rerank_score"] = score
+        head = sorted(hits[:n_scored], key=lambda h: h["rerank_score"], reverse=True)
+        elapsed = time.perf_counter() - t0
+        RERANK_SECONDS.observe(elapsed)
+        add_span("rerank", t0, elapsed)
+        self._count(len(hits), computed, cached, exhausted, seconds=elapsed)
+        return (head + hits[n_scored:])[:top_k]
+
+    def _count(self, candidates: int, scored: int, cached: int, exhausted: bool, not_ready: bool = False, seconds: float = 0.0):
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["candidates"] += candidates
+            self._stats["scored"] += scored
+            self._stats["cached"] += cached
+            self._stats["budget_exhausted"] += int(exhausted)
+            self._stats["not_ready"] += int(not_ready)
+            self._stats["seconds"] += seconds
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["batch_ms"] = round(self._batch_seconds * 1000.0, 2)
+        stats["model"] = self.model_name
+        stats["ready"] = self.ready
+        stats["error"] = self._load_error
+        stats["cache"] = self.score_cache.stats()
+        return stats
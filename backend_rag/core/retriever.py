@@ -1,232 +1,1074 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from rank_bm25 import BM25Okapi
+import contextvars
+import hashlib
 import jieba
+import json
 import os
-import pickle
 import shutil
-from typing import List, Dict, Optional
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from shared.metrics import Histogram
+from shared.tracing import add_span
+
+from .cache import LRUCache, normalize_query
+from .dense_store import ChromaDenseStore, DenseStore, MmapDenseStore
+from .embedding_backends import create_embedding_function, embedding_key
+from .embedding_batcher import EmbeddingBatcher, padding_stats, plan_batches
+from .embedding_store import EmbeddingStore, content_hash
+from .naming import is_valid_collection_name, validate_collection_name
+from .sparse_index import SparseIndex
+
+# Query path stages: tokenize (jieba), embed_query (encoder incl. batching wait, cache misses
+# only), dense_query (vector store search), bm25 (sparse scoring) and fuse
+RETRIEVAL_STAGE_SECONDS = Histogram("rag_retrieval_stage_seconds", "Time spent in each retrieval stage", ("stage",))
+EMBEDDING_ENCODE_SECONDS = Histogram("rag_embedding_encode_seconds", "Encoder time per batch", ("kind",))
+EMBEDDING_BATCH_SIZE = Histogram("rag_embedding_batch_size", "Texts per encoder batch", ("kind",),
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+
+def _record_stage(name: str, t0: float):
+    """
+    Records a retrieval stage started at `t0` in the stage histogram and the current request's trace.
+    """
+    seconds = time.perf_counter() - t0
+    RETRIEVAL_STAGE_SECONDS.observe(seconds, name)
+    add_span(name, t0, seconds)
+
+
+@contextmanager
+def _stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_stage(name, t0)
 
 class HybridRetriever:
-    def __init__(self, embed_model_name: str = "BAAI/bge-m3", db_path: str = "./rag_db"):
+    def __init__(self, embed_model_name: str = "BAAI/bge-m3", db_path: str = "./rag_db", memory_budget_mb: int = 1024,
+                 query_cache_size: int = 2048, result_cache_size: int = 1024,
+                 embed_batch_size: int = 32, embed_max_wait_ms: float = 5.0,
+                 embedding_store_path: Optional[str] = None,
+                 chunk_tokens: int = 512, chunk_overlap_tokens: int = 64, doc_batch_size: int = 64,
+                 embedding_backend: str = "torch",
+                 dense_store: str = "chroma", dense_dtype: str = "float16", dense_ivf_min_rows: int = 0, dense_nprobe: int = 8,
+                 embedding_fn=None):
         print(f"Initializing Hybrid Retriever with model: {embed_model_name}")
         self.db_path = db_path
         self.embed_model_name = embed_model_name
+        self.embedding_backend = embedding_backend
         os.makedirs(self.db_path, exist_ok=True)
         
-        # 1. Initialize Dense Retriever (ChromaDB + Sentence Transformers)
-        self.chroma_client = chromadb.PersistentClient(path=os.path.join(self.db_path, "chroma"))
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.embed_model_name)
+        # 1. Initialize Dense Retriever (Sentence Transformers on PyTorch or ONNX Runtime, vectors in
+        # ChromaDB or the native memory-mapped store)
+        # An explicit embedding_fn replaces the model (offline benchmarks)
+        self.embedding_fn = embedding_fn or create_embedding_function(self.embed_model_name, self.embedding_backend)
+        self.dense_options = {"kind": dense_store, "dtype": dense_dtype, "ivf_min_rows": dense_ivf_min_rows, "nprobe": dense_nprobe}
+        self.dense_store = self._make_dense_store()
+        # Document embeddings keyed by (model, content hash), reused across collections and re-uploads
+        self.embedding_store = EmbeddingStore(embedding_store_path or os.path.join(self.db_path, "embedding_store.db"))
+        # Ingest re-splits chunks to this token budget and embeds them in length-sorted batches
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.doc_batch_size = doc_batch_size
+        self._tokenizer = None
+        self._tokenizer_model = None
+        self._embed_stats = {"batches": 0, "texts": 0, "tokens": 0, "padded_tokens": 0, "seconds": 0.0}
+        self._embed_stats_lock = threading.Lock()
         
         # 2. Setup Sparse variables
-        self.bm25_dict = {}  # { collection_name: BM25Okapi }
+        self.bm25_dict = {}  # { collection_name: SparseIndex }
         self.corpus_chunks = {} # { collection_name: [chunks] }
         self.corpus_metadata = {} # { collection_name: [metadata] }
+        self.corpus_ids = {} # { collection_name: [chunk ids] }, aligned with corpus_chunks
+        self.corpus_rows = {} # { collection_name: { chunk id: row } } of the live chunks, for dedup on ingest
+        # Deleted chunks keep their row (None in all three lists) so positions stay aligned
+        # with the sparse index and a positional dense store
         
-        self.bm25_cache_dir = os.path.join(self.db_path, "bm25_caches")
-        os.makedirs(self.bm25_cache_dir, exist_ok=True)
-        self._load_all_bm25_caches()
+        # Collections are loaded on first access and evicted least-recently-used first
+        # once the estimated heap footprint of the resident ones exceeds the budget.
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self._resident = OrderedDict() # { collection_name: estimated bytes }, LRU order
+        self._pins = {} # { collection_name: writers in flight }, pinned collections are never evicted
+        self._write_locks = {} # { collection_name: Lock }, serializes appends from parallel ingest workers
+        self._load_lock = threading.RLock()
+        # Per-collection manifest of sources (chunk counts, sizes, ingest times, row ranges),
+        # kept on disk next to the sparse index so listings never walk the corpus
+        self._manifests = {} # { collection_name: manifest }, loaded on first use, never evicted
+        self._collection_names: Optional[List[str]] = None
         
-    def reset_database(self, new_model_name: str):
-        """
-        Wipes the entire database to switch the embedding model.
-        """
-        print(f"Wiping DB and switching model to {new_model_name}...")
-        self.embed_model_name = new_model_name
-        self.bm25_dict.clear()
-        self.corpus_chunks.clear()
-        self.corpus_metadata.clear()
+        # Repeated questions skip the encoder (embedding cache) or the whole search (result cache).
+        # Result keys carry the collection version, which every write bumps, so stale entries are never served.
+        self.query_embedding_cache = LRUCache(query_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self._versions = {} # { collection_name: write counter }
+        # Concurrent query encodes are gathered into one batch
+        self.query_batcher = EmbeddingBatcher(self._encode_queries, embed_batch_size, embed_max_wait_ms)
         
-        # Close chroma if possible, then rmtree
-        shutil.rmtree(self.db_path, ignore_errors=True)
+        # Runs the dense leg next to the sparse leg for mixed-alpha queries
+        self._leg_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-leg")
+        # Searches the collections of a federated query side by side (kept apart from the leg
+        # pool, whose tasks these would otherwise wait on)
+        self._fanout_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-fanout")
         
-        os.makedirs(self.db_path, exist_ok=True)
-        self.chroma_client = chromadb.PersistentClient(path=os.path.join(self.db_path, "chroma"))
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.embed_model_name)
+        # One directory per collection: the persisted SparseIndex plus docs.jsonl (ids, text, metadata)
+        self.sparse_dir = os.path.join(self.db_path, "sparse")
+        os.makedirs(self.sparse_dir, exist_ok=True)
+        # Pre-index caches (pickles / token logs), only read to migrate
         self.bm25_cache_dir = os.path.join(self.db_path, "bm25_caches")
-        os.makedirs(self.bm25_cache_dir, exist_ok=True)
+
+        # Writes can be frozen (model switch cut-over); once a successor index takes over,
+        # writes still arriving here are forwarded to it
+        self._write_gate = threading.Condition()
+        self._writers = 0
+        self._frozen = False
+        self.successor: Optional["HybridRetriever"] = None
+        
+    def _make_dense_store(self) -> DenseStore:
+        if self.dense_options["kind"] == "mmap":
+            return MmapDenseStore(os.path.join(self.db_path, "dense"), self.dense_options["dtype"],
+                                  self.dense_options["ivf_min_rows"], self.dense_options["nprobe"])
+        return ChromaDenseStore(os.path.join(self.db_path, "chroma"), self.embedding_fn)
 
     def _tokenize(self, text: str) -> List[str]:
         return list(jieba.cut_for_search(text))
 
-    def _build_bm25(self, collection_name: str):
+    def _normalize_query(self, query: str) -> str:
+        return normalize_query(query)
+
+    @property
+    def embedding_key(self) -> str:
+        return embedding_key(self.embed_model_name, self.embedding_backend)
+
+    def _bump_version(self, collection_name: str):
+        self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+
+    def _encode_queries(self, texts: List[str]) -> List:
+        t0 = time.perf_counter()
+        vectors = self.embedding_fn(texts)
+        EMBEDDING_ENCODE_SECONDS.observe(time.perf_counter() - t0, "query")
+        EMBEDDING_BATCH_SIZE.observe(len(texts), "query")
+        return vectors
+
+    def _embed_query(self, query: str):
+        key = (self.embedding_key, query)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            with _stage("embed_query"):
+                embedding = self.query_batcher.encode(query)
+            self.query_embedding_cache.put(key, embedding)
+        return embedding
+
+    def get_cache_stats(self) -> Dict:
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "results": self.result_cache.stats()
+        }
+
+    def _collection_dir(self, collection_name: str) -> str:
+        return os.path.join(self.sparse_dir, validate_collection_name(collection_name))
+
+    def _docs_path(self, collection_name: str) -> str:
+        return os.path.join(self._collection_dir(collection_name), "docs.jsonl")
+
+    def _write_docs(self, collection_name: str, ids: List[str], docs: List[str], metas: List[Dict], mode: str):
+        with open(self._docs_path(collection_name), mode, encoding="utf-8") as f:
+            for doc_id, doc, meta in zip(ids, docs, metas):
+                f.write(json.dumps({"id": doc_id, "content": doc, "metadata": meta}, ensure_ascii=False) + "\n")
+
+    def _build_bm25(self, collection_name: str, tokenized: Optional[List[List[str]]] = None):
+        """
+        Full rebuild of a collection's on-disk sparse index from corpus_chunks.
+        Only used when migrating data that has no index yet; pass `tokenized` to skip jieba.
+        """
+        ids = self.corpus_ids.get(collection_name, [])
         chunks = self.corpus_chunks.get(collection_name, [])
-        if not chunks:
-            self.bm25_dict[collection_name] = None
-            return
-        tokenized_corpus = [self._tokenize(doc) for doc in chunks]
-        self.bm25_dict[collection_name] = BM25Okapi(tokenized_corpus)
-        
-        # Save cache
-        cache_path = os.path.join(self.bm25_cache_dir, f"{collection_name}.pkl")
-        with open(cache_path, "wb") as f:
-            pickle.dump((self.corpus_chunks[collection_name], self.corpus_metadata[collection_name]), f)
+        metas = self.corpus_metadata.get(collection_name, [])
+        if tokenized is None:
+            tokenized = [self._tokenize(doc) for doc in chunks]
+        col_dir = self._collection_dir(collection_name)
+        shutil.rmtree(col_dir, ignore_errors=True)
+        index = SparseIndex(col_dir)
+        self._write_docs(collection_name, ids, chunks, metas, "w")
+        index.add(tokenized)
+        self.bm25_dict[collection_name] = index
+
+    def _append_bm25(self, collection_name: str, ids: List[str], docs: List[str], metas: List[Dict]):
+        """
+        Tokenizes only the new chunks and folds them into the persisted sparse index.
+        """
+        index = self.bm25_dict.get(collection_name)
+        if index is None:
+            index = SparseIndex(self._collection_dir(collection_name))
+            self.bm25_dict[collection_name] = index
+        tokenized = [self._tokenize(doc) for doc in docs]
+        # docs.jsonl first: on open, lines beyond the index's committed doc count are dropped
+        self._write_docs(collection_name, ids, docs, metas, "a")
+        index.add(tokenized)
+
+    def _ensure_loaded(self, collection_name: str) -> bool:
+        """
+        Makes a collection resident (loading it from disk on first access) and marks it
+        most recently used. Returns False if the collection does not exist.
+        """
+        with self._load_lock:
+            if collection_name in self._resident:
+                self._resident.move_to_end(collection_name)
+                return True
+            t0 = time.perf_counter()
+            self._load_bm25(collection_name)
+            if collection_name not in self.corpus_chunks:
+                return False
+            if self.dense_store.positional:
+                self._sync_dense(collection_name)
+            self._resident[collection_name] = self._estimate_bytes(collection_name)
+            self._evict()
+            # A cold collection shows up in the trace of the request that loaded it
+            add_span("load_collection", t0, time.perf_counter() - t0)
+            return True
+
+    def _sync_dense(self, collection_name: str):
+        """
+        Lines a positional dense store up with the loaded corpus: rows past it (an interrupted
+        write) are dropped, missing rows (first start on this store) are embedded, mostly
+        straight from the embedding store.
+        """
+        n_rows = len(self.corpus_ids[collection_name])
+        self.dense_store.create_collection(collection_name)
+        present = self.dense_store.count(collection_name)
+        if present > n_rows:
+            self.dense_store.truncate(collection_name, n_rows)
+        elif present < n_rows:
+            print(f"Filling dense store for {collection_name}: {n_rows - present} chunks")
+            for start in range(present, n_rows, 1024):
+                end = min(start + 1024, n_rows)
+                docs = self.corpus_chunks[collection_name][start:end]
+                metas = self.corpus_metadata[collection_name][start:end]
+                # Deleted rows still take their position (as an empty text) and are tombstoned
+                deleted = [start + i for i, d in enumerate(docs) if d is None]
+                docs = [d if d is not None else "" for d in docs]
+                hashes = [(m or {}).get("content_hash") or content_hash(d) for d, m in zip(docs, metas)]
+                embeddings, _ = self._embed_documents(docs, hashes)
+                ids = [doc_id or "" for doc_id in self.corpus_ids[collection_name][start:end]]
+                self.dense_store.add(collection_name, ids, embeddings, docs, [m or {} for m in metas])
+                if deleted:
+                    self.dense_store.delete(collection_name, [], deleted)
+
+    def _estimate_bytes(self, collection_name: str) -> int:
+        size = 0
+        for doc_id, doc, meta in zip(self.corpus_ids[collection_name], self.corpus_chunks[collection_name], self.corpus_metadata[collection_name]):
+            if doc is not None:
+                size += sys.getsizeof(doc_id) + sys.getsizeof(doc) + self._meta_bytes(meta)
+        size += sys.getsizeof(self.corpus_rows[collection_name])
+        index = self.bm25_dict.get(collection_name)
+        if index is not None:
+            size += index.memory_bytes()
+        return size
+
+    def _meta_bytes(self, meta: Optional[Dict]) -> int:
+        if not meta:
+            return 0
+        return sys.getsizeof(meta) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in meta.items())
 
-    def _load_all_bm25_caches(self):
+    def _evict(self):
+        # Never evict the most recently used collection (even if it alone exceeds the budget)
+        # or one that is being written to
+        total = sum(self._resident.values())
+        for name in list(self._resident)[:-1]:
+            if total <= self.memory_budget_bytes:
+                break
+            if self._pins.get(name):
+                continue
+            size = self._resident[name]
+            self._unload(name)
+            total -= size
+            print(f"Evicted collection {name} from memory ({size / 1024 / 1024:.1f} MB)")
+
+    def _write_lock(self, collection_name: str) -> threading.Lock:
+        with self._load_lock:
+            return self._write_locks.setdefault(collection_name, threading.Lock())
+
+    @contextmanager
+    def _pinned(self, collection_name: str):
+        with self._load_lock:
+            self._ensure_loaded(collection_name)
+            self._pins[collection_name] = self._pins.get(collection_name, 0) + 1
         try:
-            collections = self.chroma_client.list_collections()
-            for c in collections:
-                self._load_bm25(c.name)
-        except Exception as e:
-            print("Error loading bm25 caches:", e)
+            yield
+        finally:
+            with self._load_lock:
+                self._pins[collection_name] -= 1
+                if not self._pins[collection_name]:
+                    del self._pins[collection_name]
+
+    def _unload(self, collection_name: str):
+        self._resident.pop(collection_name, None)
+        self.bm25_dict.pop(collection_name, None)
+        self.corpus_chunks.pop(collection_name, None)
+        self.corpus_metadata.pop(collection_name, None)
+        self.corpus_ids.pop(collection_name, None)
+        self.corpus_rows.pop(collection_name, None)
+
+    def get_memory_stats(self) -> Dict:
+        with self._load_lock:
+            collections = []
+            for name, size in self._resident.items():
+                index = self.bm25_dict.get(name)
+                collections.append({
+                    "name": name,
+                    "chunks": len(self.corpus_chunks.get(name, [])) - (index.n_deleted if index is not None else 0),
+                    "heap_bytes": size,
+                    "mapped_bytes": index.mapped_bytes() if index is not None else 0
+                })
+            return {
+                "budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": sum(self._resident.values()),
+                "collections": collections,
+                "dense_store": self.dense_store.stats()
+            }
+
+    def _open_bm25(self, collection_name: str) -> bool:
+        col_dir = self._collection_dir(collection_name)
+        if not os.path.exists(os.path.join(col_dir, "meta.json")):
+            return False
+        try:
+            index = SparseIndex.open(col_dir)
+        except ValueError as e:
+            print(f"Rebuilding sparse index for {collection_name}: {e}")
+            return False
+        ids, chunks, metas = [], [], []
+        with open(self._docs_path(collection_name), "r", encoding="utf-8") as f:
+            for row in range(index.n_docs):
+                rec = json.loads(f.readline())
+                if index.is_deleted(row):
+                    ids.append(None)
+                    chunks.append(None)
+                    metas.append(None)
+                    continue
+                ids.append(rec["id"])
+                chunks.append(rec["content"])
+                metas.append(rec["metadata"])
+            committed = f.tell()
+        if os.path.getsize(self._docs_path(collection_name)) > committed:
+            with open(self._docs_path(collection_name), "r+b") as f:
+                f.truncate(committed)
+        self._set_corpus(collection_name, ids, chunks, metas)
+        self.bm25_dict[collection_name] = index
+        return True
+
+    def _set_corpus(self, collection_name: str, ids: List[Optional[str]], chunks: List[Optional[str]], metas: List[Optional[Dict]]):
+        self.corpus_ids[collection_name] = ids
+        self.corpus_chunks[collection_name] = chunks
+        self.corpus_metadata[collection_name] = metas
+        self.corpus_rows[collection_name] = {doc_id: row for row, doc_id in enumerate(ids) if doc_id is not None}
 
     def _load_bm25(self, collection_name: str):
-        cache_path = os.path.join(self.bm25_cache_dir, f"{collection_name}.pkl")
-        if os.path.exists(cache_path):
-            with open(cache_path, "rb") as f:
-                self.corpus_chunks[collection_name], self.corpus_metadata[collection_name] = pickle.load(f)
-                self._build_bm25(collection_name)
-        else:
+        if self._open_bm25(collection_name):
+            return
+
+        token_log = os.path.join(self.bm25_cache_dir, f"{collection_name}.jsonl")
+        legacy_pickle = os.path.join(self.bm25_cache_dir, f"{collection_name}.pkl")
+        migrated = False
+        if os.path.exists(token_log):
+            # Token log from the previous format already carries tokens: convert without jieba
+            ids, chunks, metas, tokenized = [], [], [], []
+            with open(token_log, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    rec = json.loads(line)
+                    ids.append(rec.get("id"))
+                    chunks.append(rec["content"])
+                    metas.append(rec["metadata"])
+                    tokenized.append(rec["tokens"])
+            if None not in ids:
+                self._set_corpus(collection_name, ids, chunks, metas)
+                self._build_bm25(collection_name, tokenized)
+                migrated = True
+        if not migrated:
+            # No usable cache: a dense store that keeps text (Chroma) holds the authoritative
+            # ids, chunks and metadata, so build the index from it once.
             try:
-                coll = self.chroma_client.get_collection(name=collection_name, embedding_function=self.embedding_fn)
-                results = coll.get()
-                if results and results['documents']:
-                    self.corpus_chunks[collection_name] = results['documents']
-                    self.corpus_metadata[collection_name] = results['metadatas']
+                results = self.dense_store.get_all(collection_name)
+                if results is None:
+                    # Raises for unknown collections
+                    self.dense_store.count(collection_name)
+                    results = ([], [], [])
+                if results[1]:
+                    self._set_corpus(collection_name, *results)
                     self._build_bm25(collection_name)
                 else:
-                    self.corpus_chunks[collection_name] = []
-                    self.corpus_metadata[collection_name] = []
+                    self._set_corpus(collection_name, [], [], [])
             except Exception:
                 pass
+        for legacy_path in (token_log, legacy_pickle):
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+    def _collection_listing(self) -> List[str]:
+        """
+        Collection names, cached until a collection is created or deleted.
+        """
+        with self._load_lock:
+            if self._collection_names is None:
+                # Directories that are not valid collection names cannot be addressed, so they are not listed
+                names = [name for name in self.dense_store.list_collections() if is_valid_collection_name(name)]
+                if self.dense_store.positional:
+                    # Collections indexed before switching to this store are filled in on first load
+                    for name in sorted(os.listdir(self.sparse_dir)):
+                        if name not in names and is_valid_collection_name(name) and self._ensure_loaded(name):
+                            names.append(name)
+                self._collection_names = names
+            return list(self._collection_names)
 
     def get_collections(self) -> List[Dict]:
         try:
-            collections = self.chroma_client.list_collections()
             res = []
-            for c in collections:
-                count = c.count()
-                res.append({"name": c.name, "count": count})
+            for name in self._collection_listing():
+                manifest = self._load_manifest(name)
+                count = sum(entry["chunks"] for entry in manifest["sources"].values()) if manifest else 0
+                res.append({"name": name, "count": count})
             return res
         except Exception as e:
             print(e)
             return []
 
     def get_collection_files(self, name: str) -> List[Dict]:
-        if name not in self.corpus_metadata:
+        manifest = self._load_manifest(name)
+        if manifest is None:
             return []
-        
-        file_stats = {}
-        for meta in self.corpus_metadata[name]:
-            if not meta: continue
-            src = meta.get("source", "Unknown")
-            if src not in file_stats:
-                file_stats[src] = 1
-            else:
-                file_stats[src] += 1
-                
-        # Return list of files with their chunk counts
-        files = []
-        for src, chunks in file_stats.items():
-            files.append({"filename": src, "chunks": chunks})
-        return files
+        with self._load_lock:
+            return [{
+                "filename": src,
+                "chunks": entry["chunks"],
+                "bytes": entry["bytes"],
+                "file_size": entry.get("file_size"),
+                "sha256": entry.get("sha256"),
+                "ingested_at": entry["ingested_at"],
+                "updated_at": entry["updated_at"]
+            } for src, entry in manifest["sources"].items()]
+
+    def _manifest_path(self, collection_name: str) -> str:
+        return os.path.join(self._collection_dir(collection_name), "manifest.json")
+
+    def _load_manifest(self, collection_name: str) -> Optional[Dict]:
+        """
+        The collection's source manifest: read from disk once, then kept current by every write.
+        It records the sparse index commit it describes; if that does not match (first start,
+        interrupted write) it is rebuilt from the corpus.
+        """
+        with self._load_lock:
+            manifest = self._manifests.get(collection_name)
+            if manifest is not None:
+                return manifest
+            try:
+                with open(os.path.join(self._collection_dir(collection_name), "meta.json"), "r", encoding="utf-8") as f:
+                    index_meta = json.load(f)
+                with open(self._manifest_path(collection_name), "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if (manifest["n_rows"], manifest["tombstones"]) != (index_meta["n_docs"], index_meta.get("tombstones")):
+                    manifest = None
+            except (OSError, ValueError, KeyError):
+                manifest = None
+            if manifest is None:
+                if not self._ensure_loaded(collection_name):
+                    return None
+                manifest = self._build_manifest(collection_name)
+                self._write_manifest(collection_name, manifest)
+            self._manifests[collection_name] = manifest
+            return manifest
+
+    def _build_manifest(self, collection_name: str) -> Dict:
+        sources: Dict[str, Dict] = {}
+        for row, (doc, meta) in enumerate(zip(self.corpus_chunks[collection_name], self.corpus_metadata[collection_name])):
+            if doc is not None:
+                self._manifest_add(sources, (meta or {}).get("source", "Unknown"), row, row + 1, len(doc.encode("utf-8")), None)
+        index = self.bm25_dict.get(collection_name)
+        return {"n_rows": len(self.corpus_ids[collection_name]), "tombstones": index.tombstones if index is not None else None, "sources": sources}
+
+    def _manifest_add(self, sources: Dict[str, Dict], source_name: str, start: int, end: int, n_bytes: int, now: Optional[float]):
+        entry = sources.get(source_name)
+        if entry is None:
+            entry = sources[source_name] = {"chunks": 0, "bytes": 0, "ingested_at": now, "updated_at": now, "row_ranges": []}
+        entry["chunks"] += end - start
+        entry["bytes"] += n_bytes
+        entry["updated_at"] = now
+        ranges = entry["row_ranges"]
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+
+    def _write_manifest(self, collection_name: str, manifest: Dict):
+        if not os.path.isdir(self._collection_dir(collection_name)):
+            return
+        tmp_path = self._manifest_path(collection_name) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._manifest_path(collection_name))
+
+    def _sync_manifest(self, collection_name: str):
+        """
+        Stamps the manifest with the sparse index commit it now describes and persists it.
+        Callers hold the collection's write lock, so no other write touches it meanwhile.
+        """
+        manifest = self._manifests.get(collection_name)
+        index = self.bm25_dict.get(collection_name)
+        if manifest is None or index is None:
+            return
+        with self._load_lock:
+            manifest["n_rows"] = index.n_docs
+            manifest["tombstones"] = index.tombstones
+        self._write_manifest(collection_name, manifest)
+
+    def set_source_info(self, collection_name: str, source_name: str, **info):
+        """
+        Records extra facts about a source file (upload size, checksum) in the manifest.
+        """
+        with self._writing() as target:
+            if target is not self:
+                return target.set_source_info(collection_name, source_name, **info)
+            with self._pinned(collection_name):
+                manifest = self._load_manifest(collection_name)
+                if manifest is None or source_name not in manifest["sources"]:
+                    return
+                with self._write_lock(collection_name):
+                    with self._load_lock:
+                        manifest["sources"][source_name].update(info)
+                    self._sync_manifest(collection_name)
+
+    @contextmanager
+    def _writing(self):
+        """
+        Held by every write. Yields the retriever that should take it: this one, or the
+        successor once a model switch has been cut over.
+        """
+        with self._write_gate:
+            while self._frozen:
+                self._write_gate.wait()
+            self._writers += 1
+        try:
+            yield self.successor or self
+        finally:
+            with self._write_gate:
+                self._writers -= 1
+                self._write_gate.notify_all()
+
+    @contextmanager
+    def freeze_writes(self):
+        """
+        Blocks new writes and waits for in-flight ones to finish; writes resume on exit.
+        """
+        with self._write_gate:
+            self._frozen = True
+            while self._writers:
+                self._write_gate.wait()
+        try:
+            yield
+        finally:
+            with self._write_gate:
+                self._frozen = False
+                self._write_gate.notify_all()
 
     def create_collection(self, name: str):
-        self.chroma_client.get_or_create_collection(name=name, embedding_function=self.embedding_fn)
-        if name not in self.corpus_chunks:
-            self.corpus_chunks[name] = []
-            self.corpus_metadata[name] = []
+        validate_collection_name(name)
+        with self._writing() as target:
+            if target is not self:
+                return target.create_collection(name)
+            self.dense_store.create_collection(name)
+            self._collection_names = None
+            self._ensure_loaded(name)
 
     def delete_collection(self, name: str):
-        try:
-            self.chroma_client.delete_collection(name=name)
-        except Exception:
-            pass
-        self.bm25_dict.pop(name, None)
-        self.corpus_chunks.pop(name, None)
-        self.corpus_metadata.pop(name, None)
-        cache_path = os.path.join(self.bm25_cache_dir, f"{name}.pkl")
-        if os.path.exists(cache_path):
-            os.remove(cache_path)
-
-    def add_documents(self, chunks: list, source_name: str, collection_name: str = "default"):
+        validate_collection_name(name)
+        with self._writing() as target:
+            if target is not self:
+                return target.delete_collection(name)
+            self._delete_collection(name)
+
+    def delete_source(self, collection_name: str, source_name: str, keep_ids: Optional[set] = None) -> Optional[int]:
+        """
+        Removes one source file's chunks from the dense and sparse indexes in place (deleted
+        rows are tombstoned, nothing is rebuilt). Chunks whose ids are in `keep_ids` stay, which
+        lets a re-upload replace a file without touching its unchanged chunks.
+        Returns how many chunks were removed, or None if the collection has no such source.
+        """
+        validate_collection_name(collection_name)
+        with self._writing() as target:
+            if target is not self:
+                return target.delete_source(collection_name, source_name, keep_ids)
+            with self._pinned(collection_name):
+                manifest = self._load_manifest(collection_name)
+                if manifest is None or source_name not in manifest["sources"]:
+                    return None
+                with self._write_lock(collection_name):
+                    ids = self.corpus_ids[collection_name]
+                    rows = [row for start, end in manifest["sources"][source_name]["row_ranges"] for row in range(start, end)
+                            if ids[row] is not None and (keep_ids is None or ids[row] not in keep_ids)]
+                    if rows:
+                        self._delete_rows(collection_name, source_name, rows)
+            print(f"Deleted {len(rows)} chunks of {source_name} from {collection_name}")
+            return len(rows)
+
+    def _delete_rows(self, collection_name: str, source_name: str, rows: List[int]):
+        ids = self.corpus_ids[collection_name]
+        chunks = self.corpus_chunks[collection_name]
+        metas = self.corpus_metadata[collection_name]
+        live_rows = self.corpus_rows[collection_name]
+        index = self.bm25_dict[collection_name]
+        index_bytes = index.memory_bytes()
+        # Dense first: if the sparse tombstones are lost to a crash, the rows are only ever
+        # matched by BM25 and the delete can simply be repeated
+        self.dense_store.delete(collection_name, [ids[row] for row in rows], rows)
+        index.delete(rows)
+
+        manifest = self._manifests[collection_name]
+        freed_bytes = 0
+        text_bytes = 0
+        with self._load_lock:
+            for row in rows:
+                freed_bytes += sys.getsizeof(ids[row]) + sys.getsizeof(chunks[row]) + self._meta_bytes(metas[row])
+                text_bytes += len(chunks[row].encode("utf-8"))
+                live_rows.pop(ids[row], None)
+                ids[row] = chunks[row] = metas[row] = None
+            entry = manifest["sources"][source_name]
+            entry["chunks"] -= len(rows)
+            entry["bytes"] -= text_bytes
+            entry["updated_at"] = time.time()
+            entry["row_ranges"] = self._live_ranges(entry["row_ranges"], set(rows))
+            if not entry["chunks"]:
+                del manifest["sources"][source_name]
+            if collection_name in self._resident:
+                self._resident[collection_name] += index.memory_bytes() - index_bytes - freed_bytes
+        self._sync_manifest(collection_name)
+        self._bump_version(collection_name)
+
+    def _live_ranges(self, ranges: List[List[int]], deleted: set) -> List[List[int]]:
+        live = []
+        for start, end in ranges:
+            run = None
+            for row in range(start, end):
+                if row in deleted:
+                    run = None
+                elif run is None:
+                    run = [row, row + 1]
+                    live.append(run)
+                else:
+                    run[1] = row + 1
+        return live
+
+    def _delete_collection(self, name: str):
+        self.dense_store.delete_collection(name)
+        with self._load_lock:
+            self._unload(name)
+            self._manifests.pop(name, None)
+            self._collection_names = None
+        self._bump_version(name)
+        shutil.rmtree(self._collection_dir(name), ignore_errors=True)
+        for cache_path in (os.path.join(self.bm25_cache_dir, f"{name}.jsonl"), os.path.join(self.bm25_cache_dir, f"{name}.pkl")):
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+    def close(self):
+        self._leg_pool.shutdown(wait=False)
+        self._fanout_pool.shutdown(wait=False)
+        self.query_batcher.stop()
+
+    def get_tokenizer(self):
+        """
+        The active model's (fast) tokenizer, loaded on first use. None if it cannot be loaded,
+        in which case ingest falls back to loader chunking and character lengths.
+        """
+        with self._load_lock:
+            if self._tokenizer_model != self.embed_model_name:
+                self._tokenizer_model = self.embed_model_name
+                try:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.embed_model_name)
+                except Exception as e:
+                    print(f"Tokenizer for {self.embed_model_name} unavailable, token-aware chunking disabled: {e}")
+                    self._tokenizer = None
+            return self._tokenizer
+
+    def chunk_budget(self) -> Tuple[int, int]:
+        """
+        (max_tokens, overlap_tokens) for ingest chunking under the active model.
+        """
+        tokenizer = self.get_tokenizer()
+        max_tokens = self.chunk_tokens
+        if tokenizer is not None:
+            # Leave room for the special tokens the encoder adds around every text
+            max_tokens = min(max_tokens, tokenizer.model_max_length - 2)
+        return max_tokens, min(self.chunk_overlap_tokens, max_tokens // 2)
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        tokenizer = self.get_tokenizer()
+        if tokenizer is None:
+            return [len(t) for t in texts]
+        encoded = tokenizer(texts, truncation=True, max_length=tokenizer.model_max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def get_embed_stats(self) -> Dict:
+        with self._embed_stats_lock:
+            stats = dict(self._embed_stats)
+        stats["padding_efficiency"] = stats["tokens"] / stats["padded_tokens"] if stats["padded_tokens"] else 1.0
+        stats["texts_per_second"] = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _chunk_id(self, source_name: str, chunk_hash: str) -> str:
+        # Content-addressed within a source: re-uploading an unchanged chunk maps to the same id
+        return hashlib.sha1(f"{source_name}\0{chunk_hash}".encode("utf-8")).hexdigest()
+
+    def _embed_documents(self, texts: List[str], hashes: List[str]) -> Tuple[List, int]:
+        """
+        Returns one embedding per text, computing only those missing from the embedding store.
+        Misses are encoded in length-bucketed batches to keep padding low.
+        The second value is how many texts actually went through the model.
+        """
+        known = self.embedding_store.get_many(self.embedding_key, hashes)
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        # Identical texts inside the batch are embedded once
+        missing_by_hash = {hashes[i]: texts[i] for i in missing}
+        todo = list(missing_by_hash.items())
+        if not todo:
+            return [known[h] for h in hashes], 0
+
+        lengths = self._token_lengths([text for _, text in todo])
+        batches = plan_batches(lengths, self.doc_batch_size)
+        t0 = time.perf_counter()
+        for batch in batches:
+            t_batch = time.perf_counter()
+            vectors = self.embedding_fn([todo[i][1] for i in batch])
+            EMBEDDING_ENCODE_SECONDS.observe(time.perf_counter() - t_batch, "document")
+            EMBEDDING_BATCH_SIZE.observe(len(batch), "document")
+            computed = [(todo[i][0], v) for i, v in zip(batch, vectors)]
+            self.embedding_store.put_many(self.embedding_key, computed)
+            known.update((h, np.asarray(v, dtype=np.float32)) for h, v in computed)
+        elapsed = time.perf_counter() - t0
+
+        with self._embed_stats_lock:
+            for key, value in padding_stats(lengths, batches).items():
+                self._embed_stats[key] += value
+            self._embed_stats["seconds"] += elapsed
+        return [known[h] for h in hashes], len(todo)
+
+    def add_documents(self, chunks: list, source_name: str, collection_name: str = "default",
+                      seen_ids: Optional[set] = None) -> Dict:
+        """
+        Embeds and indexes the chunks of one source file. Chunks already present in the
+        collection are skipped, and embeddings already computed for the same text with the
+        current model are reused. The ids of all given chunks, new or not, are added to
+        `seen_ids` if passed (see delete_source). Returns ingest stats.
+        """
+        validate_collection_name(collection_name)
+        with self._writing() as target:
+            if target is not self:
+                return target.add_documents(chunks, source_name, collection_name, seen_ids)
+            return self._add_documents(chunks, source_name, collection_name, seen_ids)
+
+    def _add_documents(self, chunks: list, source_name: str, collection_name: str, seen_ids: Optional[set] = None) -> Dict:
+        stats = {"chunks": len(chunks), "added": 0, "duplicates_skipped": 0, "embeddings_reused": 0, "embeddings_computed": 0}
         if not chunks:
-            return
-            
-        coll = self.chroma_client.get_or_create_collection(name=collection_name, embedding_function=self.embedding_fn)
-        
-        if collection_name not in self.corpus_chunks:
-            self.corpus_chunks[collection_name] = []
-            self.corpus_metadata[collection_name] = []
+            return stats
             
-        docs = []
-        metas = []
-        ids = []
+        self.dense_store.create_collection(collection_name)
+        if self._collection_names is not None and collection_name not in self._collection_names:
+            self._collection_names = None
         
-        start_idx = len(self.corpus_chunks[collection_name])
-        for i, chunk in enumerate(chunks):
-            docs.append(chunk.content)
-            metas.append(chunk.metadata)
-            ids.append(f"{collection_name}_{source_name}_{start_idx + i}")
-            
-            self.corpus_chunks[collection_name].append(chunk.content)
-            self.corpus_metadata[collection_name].append(chunk.metadata)
-            
-        coll.add(documents=docs, metadatas=metas, ids=ids)
-        self._build_bm25(collection_name)
-        print(f"Added {len(docs)} chunks to {collection_name}")
+        with self._pinned(collection_name):
+            self._load_manifest(collection_name)
+            existing = self.corpus_rows.get(collection_name, {})
+            new_chunks = {}
+            for chunk in chunks:
+                chunk_hash = content_hash(chunk.content)
+                chunk_id = self._chunk_id(source_name, chunk_hash)
+                if seen_ids is not None:
+                    seen_ids.add(chunk_id)
+                if chunk_id not in existing and chunk_id not in new_chunks:
+                    new_chunks[chunk_id] = (chunk, chunk_hash)
+            if not new_chunks:
+                stats["duplicates_skipped"] = len(chunks)
+                return stats
 
-    def search(self, query: str, top_k: int = 3, alpha: float = 0.5, collection_name: str = "default") -> List[Dict]:
-        try:
-            coll = self.chroma_client.get_collection(name=collection_name, embedding_function=self.embedding_fn)
-        except Exception:
+            # Embed outside the write lock so parallel ingest workers overlap on the model
+            hashes = [h for _, h in new_chunks.values()]
+            embeddings, computed = self._embed_documents([c.content for c, _ in new_chunks.values()], hashes)
+            by_id = dict(zip(new_chunks, embeddings))
+
+            with self._write_lock(collection_name):
+                if collection_name not in self.corpus_chunks:
+                    # Freshly created: nothing on disk or in the dense store yet
+                    self._set_corpus(collection_name, [], [], [])
+                    self._resident[collection_name] = 0
+                index = self.bm25_dict.get(collection_name)
+                index_bytes = index.memory_bytes() if index is not None else 0
+                first_row = len(self.corpus_ids[collection_name])
+                text_bytes = 0
+                # Another worker may have added the same chunks while we were embedding
+                existing = self.corpus_rows[collection_name]
+                    
+                docs = []
+                metas = []
+                ids = []
+                vectors = []
+                added_bytes = 0
+                
+                for chunk_id, (chunk, chunk_hash) in new_chunks.items():
+                    if chunk_id in existing:
+                        continue
+                    meta = {**chunk.metadata, "content_hash": chunk_hash}
+                    docs.append(chunk.content)
+                    metas.append(meta)
+                    ids.append(chunk_id)
+                    vectors.append(by_id[chunk_id])
+                    added_bytes += sys.getsizeof(chunk_id) + sys.getsizeof(chunk.content) + self._meta_bytes(meta)
+                    text_bytes += len(chunk.content.encode("utf-8"))
+                    
+                    existing[chunk_id] = len(self.corpus_ids[collection_name])
+                    self.corpus_ids[collection_name].append(chunk_id)
+                    self.corpus_chunks[collection_name].append(chunk.content)
+                    self.corpus_metadata[collection_name].append(meta)
+                    
+                if docs:
+                    self.dense_store.add(collection_name, ids, vectors, docs, metas)
+                    self._append_bm25(collection_name, ids, docs, metas)
+                    with self._load_lock:
+                        self._resident[collection_name] += added_bytes + self.bm25_dict[collection_name].memory_bytes() - index_bytes
+                        self._resident.move_to_end(collection_name)
+                        self._evict()
+                        manifest = self._manifests.setdefault(collection_name, {"n_rows": 0, "tombstones": None, "sources": {}})
+                        self._manifest_add(manifest["sources"], source_name, first_row, first_row + len(docs), text_bytes, time.time())
+                    self._sync_manifest(collection_name)
+                    self._bump_version(collection_name)
+
+        stats["added"] = len(docs)
+        stats["duplicates_skipped"] = len(chunks) - len(docs)
+        stats["embeddings_computed"] = computed
+        stats["embeddings_reused"] = len(docs) - min(computed, len(docs))
+        print(f"Added {len(docs)} chunks to {collection_name} ({computed} embedded, {stats['embeddings_reused']} reused)")
+        return stats
+
+    def _dense_leg(self, collection_name: str, state: Tuple, query: str, n_results: int, query_embedding=None) -> List[Dict]:
+        _, ids, chunks, metas = state
+        if query_embedding is None:
+            query_embedding = self._embed_query(query)
+        with _stage("dense_query"):
+            found = self.dense_store.query(collection_name, query_embedding, n_results)
+        hits = []
+        for hit in found:
+            if "row" in hit:
+                # Positional store: text and metadata come from the corpus snapshot
+                row = hit["row"]
+                if row >= len(ids) or ids[row] is None:
+                    continue
+                hit = {"id": ids[row], "content": chunks[row], "metadata": metas[row], "distance": hit["distance"]}
+            hits.append({
+                "id": hit["id"],
+                "content": hit["content"],
+                "metadata": hit["metadata"],
+                "score": 1.0 / (1.0 + hit["distance"])
+            })
+        return hits
+
+    def _snapshot(self, collection_name: str) -> Optional[Tuple]:
+        """
+        Grabs references to a resident collection so an eviction during the query cannot pull it away.
+        """
+        with self._load_lock:
+            if not self._ensure_loaded(collection_name):
+                return None
+            return (self.bm25_dict.get(collection_name), self.corpus_ids[collection_name],
+                    self.corpus_chunks[collection_name], self.corpus_metadata[collection_name])
+
+    def _sparse_leg(self, state: Tuple, query: str, n_results: int, query_tokens: Optional[List[str]] = None) -> List[Dict]:
+        bm25_inst, ids, chunks, metas = state
+        if not bm25_inst:
             return []
-            
-        chunks = self.corpus_chunks.get(collection_name, [])
+        if query_tokens is None:
+            with _stage("tokenize"):
+                query_tokens = self._tokenize(query)
+        with _stage("bm25"):
+            top = bm25_inst.top_k(query_tokens, n_results)
+        hits = []
+        for idx, score in top:
+            if score > 0 and ids[idx] is not None:
+                hits.append({"id": ids[idx], "content": chunks[idx], "metadata": metas[idx], "score": score})
+        return hits
+
+    def _fuse(self, dense_hits: List[Dict], sparse_hits: List[Dict], alpha: float, fusion: str) -> List[Dict]:
+        """
+        Merges both candidate sets by chunk id. "weighted" mixes the dense similarity with the
+        max-normalized BM25 score; "rrf" mixes alpha-weighted reciprocal ranks (k=60).
+        """
+        t0 = time.perf_counter()
+        # Keyed by collection too: the same file indexed in two collections has the same chunk ids
+        fused: Dict[Tuple, Dict] = {}
+        max_sparse = max((h["score"] for h in sparse_hits), default=0.0)
+        for leg, hits, weight in (("dense", dense_hits, alpha), ("sparse", sparse_hits, 1.0 - alpha)):
+            for rank, hit in enumerate(hits):
+                if fusion == "rrf":
+                    contrib = weight / (60 + rank + 1)
+                elif leg == "sparse":
+                    contrib = weight * (hit["score"] / max_sparse if max_sparse > 0 else 0.0)
+                else:
+                    contrib = weight * hit["score"]
+                key = (hit.get("collection"), hit["id"])
+                entry = fused.get(key)
+                if entry is None:
+                    fused[key] = {**hit, "score": contrib, "type": leg}
+                else:
+                    entry["score"] += contrib
+                    entry["type"] = "hybrid"
+        _record_stage("fuse", t0)
+        return list(fused.values())
+
+    def search(self, query: str, top_k: int = 3, alpha: float = 0.5, collection_name: str = "default", fusion: str = "weighted") -> List[Dict]:
+        """
+        alpha is the weight of the dense leg: 1.0 runs only the vector search, 0.0 only BM25.
+        Anything in between runs both legs concurrently and fuses their candidates.
+        """
+        query = self._normalize_query(query)
+        # Read the version before searching: a write racing this query bumps it, so the
+        # possibly mixed result below is cached under a key nobody will ask for again.
+        cache_key = (collection_name, self._versions.get(collection_name, 0), query, top_k, alpha, fusion)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return [dict(r) for r in cached]
+
+        state = self._snapshot(collection_name)
+        if state is None:
+            return []
+        chunks = state[2]
         if len(chunks) == 0:
             return []
 
-        # 1. Dense Search (Chroma)
-        dense_results = coll.query(
-            query_texts=[query],
-            n_results=min(top_k * 2, len(chunks))
-        )
-        
-        dense_scores = {}
-        if dense_results and dense_results['distances'] and dense_results['distances'][0]:
-            for idx, doc_id in enumerate(dense_results['ids'][0]):
-                dist = dense_results['distances'][0][idx]
-                sim = 1.0 / (1.0 + dist)
-                dense_scores[doc_id] = sim
-
-        # 2. Sparse Search (BM25)
-        sparse_scores = {}
-        bm25_inst = self.bm25_dict.get(collection_name)
-        if bm25_inst:
-            tokenized_query = self._tokenize(query)
-            bm25_scores = bm25_inst.get_scores(tokenized_query)
-            if len(bm25_scores) > 0:
-                max_bm25 = max(bm25_scores)
-                if max_bm25 > 0:
-                    for i, score in enumerate(bm25_scores):
-                        sim = score / max_bm25
-                        sparse_scores[i] = sim
-        
-        final_results = []
-        
-        if alpha >= 0.5:
-            for i in range(len(dense_results['documents'][0])):
-                doc_text = dense_results['documents'][0][i]
-                meta = dense_results['metadatas'][0][i]
-                final_results.append({
-                    "content": doc_text,
-                    "metadata": meta,
-                    "score": dense_scores.get(dense_results['ids'][0][i], 0.0),
-                    "type": "dense"
-                })
+        if alpha >= 1.0:
+            hits = self._dense_leg(collection_name, state, query, min(top_k, len(chunks)))
+            final_results = [{**h, "type": "dense"} for h in hits]
+        elif alpha <= 0.0:
+            hits = self._sparse_leg(state, query, top_k)
+            final_results = [{**h, "type": "sparse"} for h in hits]
         else:
-            if bm25_inst:
-                tokenized_query = self._tokenize(query)
-                scores = bm25_inst.get_scores(tokenized_query)
-                top_n = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-                for idx in top_n:
-                    if scores[idx] > 0:
-                        final_results.append({
-                            "content": chunks[idx],
-                            "metadata": self.corpus_metadata[collection_name][idx],
-                            "score": scores[idx],
-                            "type": "sparse"
-                        })
-                        
+            # Over-fetch candidates on both legs so the fusion has something to re-order
+            n_candidates = min(top_k * 2, len(chunks))
+            # Run in a copy of the request's context so the leg's spans land in its trace
+            dense_future = self._leg_pool.submit(contextvars.copy_context().run, self._dense_leg, collection_name, state, query, n_candidates)
+            sparse_hits = self._sparse_leg(state, query, n_candidates)
+            dense_hits = dense_future.result()
+            final_results = self._fuse(dense_hits, sparse_hits, alpha, fusion)
+
+        final_results = sorted(final_results, key=lambda x: x["score"], reverse=True)[:top_k]
+        self.result_cache.put(cache_key, final_results)
+        return [dict(r) for r in final_results]
+
+    def _collection_legs(self, collection_name: str, query: str, n_results: int, alpha: float, query_embedding) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """
+        Candidates of one collection for a federated search: (dense hits, sparse hits), each
+        tagged with the collection. None if the collection does not exist.
+        """
+        state = self._snapshot(collection_name)
+        if state is None:
+            return None
+        n_results = min(n_results, len(state[2]))
+        if n_results == 0:
+            return [], []
+        dense_hits = self._dense_leg(collection_name, state, query, n_results, query_embedding) if alpha > 0.0 else []
+        sparse_hits = self._sparse_leg(state, query, n_results) if alpha < 1.0 else []
+        for hit in dense_hits + sparse_hits:
+            hit["collection"] = collection_name
+        return dense_hits, sparse_hits
+
+    def _timed_legs(self, started: Dict[str, float], abandoned: threading.Event, collection_name: str, *args):
+        # A leg the query gave up on before it got a worker is not run at all
+        if abandoned.is_set():
+            return None
+        started[collection_name] = time.monotonic()
+        return self._collection_legs(collection_name, *args)
+
+    def search_many(self, query: str, collection_names: List[str], top_k: int = 3, alpha: float = 0.5,
+                    fusion: str = "weighted", timeout: Optional[float] = None, max_collections: Optional[int] = None) -> Dict:
+        """
+        Searches several collections as one. The query is embedded once and shared, the
+        collections are searched in parallel, and the dense and BM25 candidates of all of them
+        are fused together, so BM25 scores are normalized against the best match overall rather
+        than per collection. Hits carry their `collection`.
+        A collection that has not answered `timeout` seconds after its search started (or that
+        waited that long for a fan-out worker) is left out and its search cancelled where it has
+        not started yet. Only the first `max_collections` names are searched, the rest are skipped.
+        Returns {"results": [...], "collections": {name: "ok" | "missing" | "timeout" | "error" | "skipped"}}.
+        """
+        query = self._normalize_query(query)
+        names = list(dict.fromkeys(collection_names))
+        skipped = {}
+        if max_collections is not None and len(names) > max_collections:
+            skipped = {name: "skipped" for name in names[max_collections:]}
+            names = names[:max_collections]
+        cache_key = (tuple((name, self._versions.get(name, 0)) for name in names), query, top_k, alpha, fusion)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return {"results": [dict(r) for r in cached], "collections": {**{name: "ok" for name in names}, **skipped}}
+
+        query_embedding = self._embed_query(query) if alpha > 0.0 else None
+        # Over-fetch candidates on both legs so the fusion has something to re-order
+        n_candidates = top_k if alpha >= 1.0 or alpha <= 0.0 else top_k * 2
+        started: Dict[str, float] = {}
+        abandoned = threading.Event()
+        t0 = time.monotonic()
+        futures = {name: self._fanout_pool.submit(contextvars.copy_context().run, self._timed_legs, started, abandoned,
+                                                  name, query, n_candidates, alpha, query_embedding) for name in names}
+        pending = set(futures.values())
+        if timeout is None:
+            wait(pending)
+            pending = set()
+        while pending:
+            # Each collection's deadline runs from when its search started, so legs queued
+            # behind others on the fan-out pool are not charged for the wait
+            now = time.monotonic()
+            deadlines = {future: started.get(name, t0) + timeout for name, future in futures.items() if future in pending}
+            pending = {future for future, deadline in deadlines.items() if deadline > now}
+            if pending:
+                done, _ = wait(pending, timeout=min(deadlines[f] for f in pending) - now, return_when=FIRST_COMPLETED)
+                pending -= done
+        abandoned.set()
+
+        status = {}
+        dense_hits, sparse_hits = [], []
+        for name, future in futures.items():
+            if not future.done():
+                # A leg already running cannot be interrupted; it finishes and its result is dropped
+                future.cancel()
+                status[name] = "timeout"
+                continue
+            try:
+                legs = future.result()
+            except Exception as e:
+                print(f"Search in collection {name} failed: {e}")
+                status[name] = "error"
+                continue
+            if legs is None:
+                status[name] = "missing"
+                continue
+            status[name] = "ok"
+            dense_hits.extend(legs[0])
+            sparse_hits.extend(legs[1])
+        dense_hits.sort(key=lambda x: x["score"], reverse=True)
+        sparse_hits.sort(key=lambda x: x["score"], reverse=True)
+
+        if alpha >= 1.0:
+            final_results = [{**h, "type": "dense"} for h in dense_hits]
+        elif alpha <= 0.0:
+            final_results = [{**h, "type": "sparse"} for h in sparse_hits]
+        else:
+            final_results = self._fuse(dense_hits, sparse_hits, alpha, fusion)
+
         final_results = sorted(final_results, key=lambda x: x["score"], reverse=True)[:top_k]
-        return final_results
+        if all(state in ("ok", "missing") for state in status.values()):
+            self.result_cache.put(cache_key, final_results)
+        status.update(skipped)
+        return {"results": [dict(r) for r in final_results], "collections": status}
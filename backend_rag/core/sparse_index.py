@@ -0,0 +1,445 @@
+import json
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Bump whenever the on-disk layout changes; older directories are rebuilt by the retriever.
+FORMAT_VERSION = 1
+
+
+def _truncate(path: str, size: int):
+    if os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+class _Segment:
+    """
+    Immutable CSR block of postings: the postings of term `t` are
+    doc_ids[indptr[t]:indptr[t + 1]] with matching term frequencies in `tfs`.
+    Terms added to the vocabulary after the segment was sealed have no postings in it.
+    """
+
+    def __init__(self, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray):
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def from_coo(cls, term_ids: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray, n_terms: int) -> "_Segment":
+        order = np.lexsort((doc_ids, term_ids))
+        counts = np.bincount(term_ids, minlength=n_terms)
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, doc_ids[order].astype(np.int32), tfs[order].astype(np.int32))
+
+    def to_coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        term_ids = np.repeat(np.arange(self.n_terms, dtype=np.int64), np.diff(self.indptr))
+        return term_ids, np.asarray(self.doc_ids), np.asarray(self.tfs)
+
+    def save(self, directory: str, name: str):
+        np.save(os.path.join(directory, f"{name}.indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, f"{name}.docs.npy"), self.doc_ids)
+        np.save(os.path.join(directory, f"{name}.tfs.npy"), self.tfs)
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "_Segment":
+        # Memory-mapped: postings stay in the page cache instead of the Python heap
+        return cls(*(np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode="r")
+                     for part in ("indptr", "docs", "tfs")))
+
+
+class SparseIndex:
+    """
+    Incrementally maintained BM25 (Okapi) inverted index.
+
+    Scoring mirrors rank_bm25.BM25Okapi (same k1/b/epsilon defaults and the same
+    negative-IDF flooring), so ranking is identical to a full rebuild. Postings live
+    in NumPy CSR segments: each `add` seals one segment and small segments are merged
+    log-structured style, so ingest cost stays proportional to the new postings.
+    A query only reads the postings of its own terms.
+
+    `delete` tombstones documents: their postings are subtracted from the document
+    frequencies and length totals right away (so scores match an index built without them)
+    and physically dropped the next time their segment is merged. Document indices of the
+    remaining documents never change.
+
+    When created with a `path`, the index is persisted there in a versioned layout that
+    `SparseIndex.open` maps back without re-tokenizing anything:
+        meta.json              format version, BM25 parameters, counts and live segment names
+        vocab.jsonl            one JSON-encoded term per line, term id = line number (append-only)
+        doc_len.i32            raw int32 document lengths (append-only)
+        seg-N.{indptr,docs,tfs}.npy   CSR postings of one segment, opened with mmap
+        tombstones-N.npy       int32 indices of deleted documents (replaced on every delete)
+    meta.json is replaced atomically after the other files are written, so it is the commit
+    point: anything beyond the counts it records is discarded on open.
+
+    Writes are serialized by a lock. A query takes the lock only to refresh the IDF and grab
+    a consistent view (IDF, segments, lengths, counts); it scores outside of it, so queries
+    run in parallel with each other and with an `add`.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.path = path
+
+        self.vocab: Dict[str, int] = {}
+        self.segments: List[_Segment] = []
+        self._df = np.zeros(0, dtype=np.int64)
+        self._doc_len = np.zeros(0, dtype=np.int32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self.n_docs = 0
+        self.n_deleted = 0
+        self.total_len = 0
+
+        self._idf = np.zeros(0)
+        self._version = 0  # bumped by every add and delete
+        self._idf_version = -1  # version the IDF was computed for
+        self._lock = threading.RLock()
+
+        self._segment_names: List[str] = []
+        self._next_segment = 0
+        self._tombstones_name: Optional[str] = None
+        self._next_tombstones = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def open(cls, path: str) -> "SparseIndex":
+        """
+        Maps a persisted index back into memory. Raises ValueError for an unknown format version.
+        """
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported sparse index format {meta.get('format_version')} in {path}")
+
+        index = cls(path, k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"])
+        n_terms, n_docs = meta["n_terms"], meta["n_docs"]
+
+        vocab_path = os.path.join(path, "vocab.jsonl")
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            for tid in range(n_terms):
+                index.vocab[json.loads(f.readline())] = tid
+            # Drop terms appended by a write that never reached meta.json
+            f_end = f.tell()
+        _truncate(vocab_path, f_end)
+
+        doc_len_path = os.path.join(path, "doc_len.i32")
+        _truncate(doc_len_path, n_docs * 4)
+        index._doc_len = np.fromfile(doc_len_path, dtype=np.int32, count=n_docs)
+        index.n_docs = n_docs
+        index.total_len = meta["total_len"]
+
+        index._deleted = np.zeros(n_docs, dtype=bool)
+        index._tombstones_name = meta.get("tombstones")
+        index._next_tombstones = meta.get("next_tombstones", 0)
+        if index._tombstones_name:
+            index._deleted[np.load(os.path.join(path, f"{index._tombstones_name}.npy"))] = True
+            index.n_deleted = int(index._deleted.sum())
+
+        index._segment_names = list(meta["segments"])
+        index._next_segment = meta["next_segment"]
+        index.segments = [_Segment.load(path, name) for name in index._segment_names]
+        index._df = np.zeros(n_terms, dtype=np.int64)
+        for seg in index.segments:
+            if index.n_deleted:
+                # Postings of deleted documents not yet merged away
+                term_ids, doc_ids, _ = seg.to_coo()
+                index._df[:seg.n_terms] += np.bincount(term_ids[~index._deleted[doc_ids]], minlength=seg.n_terms)
+            else:
+                index._df[:seg.n_terms] += np.diff(seg.indptr)
+        index._remove_stale_segments()
+        return index
+
+    @property
+    def corpus_size(self) -> int:
+        return self.n_docs
+
+    @property
+    def n_live(self) -> int:
+        return self.n_docs - self.n_deleted
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / self.n_live if self.n_live else 0.0
+
+    @property
+    def tombstones(self) -> Optional[str]:
+        """
+        Name of the current tombstone file (None before the first delete); changes with every delete.
+        """
+        return self._tombstones_name
+
+    def is_deleted(self, doc_idx: int) -> bool:
+        return doc_idx < len(self._deleted) and bool(self._deleted[doc_idx])
+
+    @property
+    def doc_len(self) -> np.ndarray:
+        return self._doc_len[:self.n_docs]
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate Python-heap footprint. Memory-mapped segments are not counted: they live
+        in the OS page cache and are shared between processes (see mapped_bytes).
+        """
+        size = self._df.nbytes + self._doc_len.nbytes + self._deleted.nbytes + self._idf.nbytes
+        # dict slot + interned key + small int per vocabulary entry
+        size += sys.getsizeof(self.vocab) + sum(sys.getsizeof(t) + 28 for t in self.vocab)
+        for seg in self.segments:
+            if not isinstance(seg.doc_ids, np.memmap):
+                size += seg.indptr.nbytes + seg.doc_ids.nbytes + seg.tfs.nbytes
+        return size
+
+    def mapped_bytes(self) -> int:
+        return sum(seg.indptr.nbytes + seg.doc_ids.nbytes + seg.tfs.nbytes
+                   for seg in self.segments if isinstance(seg.doc_ids, np.memmap))
+
+    def _grow(self, arr: np.ndarray, size: int) -> np.ndarray:
+        if size <= len(arr):
+            return arr
+        grown = np.zeros(max(size, 2 * len(arr), 16), dtype=arr.dtype)
+        grown[:len(arr)] = arr
+        return grown
+
+    def add(self, tokenized_docs: List[List[str]]):
+        """
+        Appends already tokenized documents. Document indices continue from the current corpus size.
+        """
+        if not tokenized_docs:
+            return
+        with self._lock:
+            self._add(tokenized_docs)
+
+    def _add(self, tokenized_docs: List[List[str]]):
+        n_old_terms = len(self.vocab)
+        term_ids, doc_ids, tfs, lens = [], [], [], []
+        for offset, tokens in enumerate(tokenized_docs):
+            freqs: Dict[int, int] = {}
+            for t in tokens:
+                tid = self.vocab.get(t)
+                if tid is None:
+                    tid = len(self.vocab)
+                    self.vocab[t] = tid
+                freqs[tid] = freqs.get(tid, 0) + 1
+            doc_idx = self.n_docs + offset
+            for tid, tf in freqs.items():
+                term_ids.append(tid)
+                doc_ids.append(doc_idx)
+                tfs.append(tf)
+            lens.append(len(tokens))
+
+        n_terms = len(self.vocab)
+        term_arr = np.asarray(term_ids, dtype=np.int64)
+        self._df = self._grow(self._df, n_terms)
+        np.add.at(self._df, term_arr, 1)
+
+        self._doc_len = self._grow(self._doc_len, self.n_docs + len(lens))
+        self._doc_len[self.n_docs:self.n_docs + len(lens)] = lens
+        self._deleted = self._grow(self._deleted, self.n_docs + len(lens))
+        self.n_docs += len(lens)
+        self.total_len += sum(lens)
+
+        self._push_segment(_Segment.from_coo(
+            term_arr, np.asarray(doc_ids, dtype=np.int32), np.asarray(tfs, dtype=np.int32), n_terms
+        ))
+        self._merge_segments()
+        self._version += 1
+        if self.path:
+            self._persist(n_old_terms, lens)
+
+    def delete(self, doc_idxs: List[int]) -> int:
+        """
+        Tombstones documents by index. Returns how many were live before the call.
+        """
+        with self._lock:
+            return self._delete(doc_idxs)
+
+    def _delete(self, doc_idxs: List[int]) -> int:
+        idxs = np.unique(np.asarray(doc_idxs, dtype=np.int64))
+        idxs = idxs[(idxs >= 0) & (idxs < self.n_docs)]
+        idxs = idxs[~self._deleted[idxs]]
+        if not len(idxs):
+            return 0
+        doomed = np.zeros(self.n_docs, dtype=bool)
+        doomed[idxs] = True
+        for seg in self.segments:
+            term_ids, doc_ids, _ = seg.to_coo()
+            hit = doomed[doc_ids]
+            if hit.any():
+                self._df[:seg.n_terms] -= np.bincount(term_ids[hit], minlength=seg.n_terms)
+        self._deleted[idxs] = True
+        self.n_deleted += len(idxs)
+        self.total_len -= int(self._doc_len[idxs].sum())
+        self._version += 1
+        if self.path:
+            self._tombstones_name = f"tombstones-{self._next_tombstones:06d}"
+            self._next_tombstones += 1
+            np.save(os.path.join(self.path, f"{self._tombstones_name}.npy"),
+                    np.flatnonzero(self._deleted[:self.n_docs]).astype(np.int32))
+            self._write_meta()
+        return len(idxs)
+
+    def _push_segment(self, segment: _Segment):
+        self.segments.append(segment)
+        self._segment_names.append(f"seg-{self._next_segment:06d}")
+        self._next_segment += 1
+
+    def _merge_segments(self):
+        # Merge the newest segment into its predecessor while it is at least half as large,
+        # which keeps the segment count logarithmic in the number of postings.
+        while len(self.segments) >= 2 and self.segments[-1].size * 2 >= self.segments[-2].size:
+            newer = self.segments.pop()
+            older = self.segments.pop()
+            del self._segment_names[-2:]
+            n_terms = max(older.n_terms, newer.n_terms)
+            parts = []
+            for seg in (older, newer):
+                term_ids, doc_ids, tfs = seg.to_coo()
+                # Compaction: postings of deleted documents are not carried over
+                live = ~self._deleted[doc_ids]
+                parts.append((term_ids[live], doc_ids[live], tfs[live]))
+            self._push_segment(_Segment.from_coo(
+                np.concatenate([p[0] for p in parts]),
+                np.concatenate([p[1] for p in parts]),
+                np.concatenate([p[2] for p in parts]),
+                n_terms,
+            ))
+
+    def _persist(self, n_old_terms: int, new_lens: List[int]):
+        on_disk = set(self._list_segment_files())
+        for i, name in enumerate(self._segment_names):
+            if name not in on_disk:
+                self.segments[i].save(self.path, name)
+                self.segments[i] = _Segment.load(self.path, name)
+
+        terms = list(self.vocab)[n_old_terms:]
+        with open(os.path.join(self.path, "vocab.jsonl"), "a", encoding="utf-8") as f:
+            for term in terms:
+                f.write(json.dumps(term, ensure_ascii=False) + "\n")
+        with open(os.path.join(self.path, "doc_len.i32"), "ab") as f:
+            np.asarray(new_lens, dtype=np.int32).tofile(f)
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "n_docs": self.n_docs,
+            "n_terms": len(self.vocab),
+            "total_len": self.total_len,
+            "segments": self._segment_names,
+            "next_segment": self._next_segment,
+            "tombstones": self._tombstones_name,
+            "next_tombstones": self._next_tombstones,
+        }
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+        self._remove_stale_segments()
+
+    def _list_segment_files(self) -> List[str]:
+        return [f.split(".")[0] for f in os.listdir(self.path) if f.startswith("seg-")]
+
+    def _remove_stale_segments(self):
+        live = set(self._segment_names)
+        live.add(self._tombstones_name)
+        for f in os.listdir(self.path):
+            if f.startswith(("seg-", "tombstones-")) and f.split(".")[0] not in live:
+                try:
+                    os.remove(os.path.join(self.path, f))
+                except OSError:
+                    # Still mapped somewhere (Windows); retried on the next write or open
+                    pass
+
+    def _scoring_view(self) -> Tuple:
+        """
+        (idf, segments, doc_len, deleted, avgdl, n_live), consistent with each other.
+        The arrays stay valid after the lock is released: growing replaces them, documents
+        added later only appear in later segments, and the only in-place change, a delete
+        setting flags, just hides documents deleted while the query runs.
+        """
+        with self._lock:
+            # BM25Okapi's epsilon floor depends on the average IDF over the whole vocabulary,
+            # so IDF is recomputed lazily (O(vocabulary), not O(corpus tokens)) after writes
+            n_terms = len(self.vocab)
+            if self._idf_version != self._version or len(self._idf) != n_terms:
+                df = self._df[:n_terms].astype(np.float64)
+                idf = np.log(self.n_live - df + 0.5) - np.log(df + 0.5)
+                # Terms only deleted documents used do not count, as in a rebuild without them
+                present = df > 0
+                if present.any():
+                    eps = self.epsilon * idf[present].mean()
+                    idf[idf < 0] = eps
+                self._idf = idf
+                self._idf_version = self._version
+            return self._idf, list(self.segments), self._doc_len, self._deleted, self.avgdl, self.n_live
+
+    def top_k(self, query_tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (doc_idx, score) pairs with the highest BM25 scores, best first.
+        Documents sharing no term with the query are never scored.
+        """
+        if k <= 0:
+            return []
+        idf, segments, doc_len, deleted, avgdl, n_live = self._scoring_view()
+        if not n_live:
+            return []
+
+        # Repeated query terms count once per occurrence, as in BM25Okapi.get_scores.
+        # Terms added after the view was taken have no IDF in it and are skipped.
+        weights: Dict[int, int] = {}
+        for q in query_tokens:
+            tid = self.vocab.get(q)
+            if tid is not None and tid < len(idf):
+                weights[tid] = weights.get(tid, 0) + 1
+        if not weights:
+            return []
+
+        k1, b = self.k1, self.b
+        hit_docs, hit_scores = [], []
+        for seg in segments:
+            for tid, mult in weights.items():
+                if tid >= seg.n_terms:
+                    continue
+                start, end = seg.indptr[tid], seg.indptr[tid + 1]
+                if start == end:
+                    continue
+                docs = seg.doc_ids[start:end]
+                tf = seg.tfs[start:end].astype(np.float64)
+                norm = k1 * (1 - b + b * doc_len[docs] / avgdl)
+                hit_docs.append(docs)
+                hit_scores.append(mult * idf[tid] * (tf * (k1 + 1) / (tf + norm)))
+        if not hit_docs:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(hit_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(hit_scores))
+        # Checked even when the view had no deletes: a delete may have landed since
+        live = ~deleted[docs]
+        if not live.all():
+            docs, scores = docs[live], scores[live]
+            if not len(docs):
+                return []
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(docs[i]), float(scores[i])) for i in top]
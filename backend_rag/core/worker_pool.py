@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from shared.tracing import add_span
+
+
+class PoolSaturated(Exception):
+    """
+    Raised when a call is submitted while every worker is busy and the wait queue is full.
+    """
+    pass
+
+
+class WorkerPool:
+    """
+    Bounded thread pool that lets async handlers run blocking retriever calls
+    (embedding encode, Chroma query, BM25 scoring) without stalling the event loop.
+
+    At most `max_workers` calls run at once and at most `max_queue` more may wait;
+    anything beyond that is rejected immediately with PoolSaturated so the caller can
+    answer 429 instead of letting latency grow without bound.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, name: str = "rag-worker"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # Calls submitted and not yet finished. Released by the worker when the call ends, not
+        # when the awaiting request goes away, so a cancelled request keeps its slot until the
+        # thread it occupies is actually free.
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._pending_lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(f"{self._pending} calls in flight")
+            self._pending += 1
+        call = functools.partial(fn, *args, **kwargs)
+        submitted = time.perf_counter()
+
+        def run_traced():
+            # Time spent waiting for a free worker is a span of its own
+            add_span("pool_wait", submitted, time.perf_counter() - submitted)
+            return call()
+        try:
+            # The call runs in a copy of the caller's context, so spans it records join the request's trace
+            future = self._executor.submit(contextvars.copy_context().run, run_traced)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future=None):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "in_flight": min(self._pending, self.max_workers),
+            "queued": max(self._pending - self.max_workers, 0),
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterator, List
 
 class DocumentChunk:
     def __init__(self, content: str, metadata: dict):
@@ -13,8 +13,15 @@ class BaseLoader(ABC):
     """
     
     @abstractmethod
+    def stream(self, file_path: str) -> Iterator[DocumentChunk]:
+        """
+        Parses the document lazily, yielding DocumentChunks in document order.
+        Implementations should hold at most a few chunks in memory at a time.
+        """
+        pass
+
     def load(self, file_path: str) -> List[DocumentChunk]:
         """
         Parses the document and returns a list of DocumentChunks.
         """
-        pass
+        return list(self.stream(file_path))
@@ -0,0 +1,45 @@
+from typing import Iterable, Iterator, List
+from .base import DocumentChunk
+
+class TokenChunker:
+    """
+    Re-splits loader output to a token budget measured with the embedding model's own
+    tokenizer, so no chunk is silently truncated by the encoder.
+
+    Chunks within `max_tokens` pass through unchanged. Longer ones are cut into windows of
+    `max_tokens` tokens that overlap by `overlap_tokens`; each piece is sliced from the
+    original text via the tokenizer's offset mapping, so whitespace and punctuation survive
+    exactly. Pieces keep the source metadata plus a 1-based `part`.
+    Requires a HuggingFace fast tokenizer (offset mapping support).
+    """
+
+    def __init__(self, tokenizer, max_tokens: int = 512, overlap_tokens: int = 64):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def rechunk(self, chunks: Iterable[DocumentChunk]) -> Iterator[DocumentChunk]:
+        for chunk in chunks:
+            yield from self.split(chunk)
+
+    def split(self, chunk: DocumentChunk) -> List[DocumentChunk]:
+        text = chunk.content
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        if len(offsets) <= self.max_tokens:
+            return [chunk]
+
+        pieces = []
+        step = self.max_tokens - self.overlap_tokens
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.max_tokens]
+            piece = text[window[0][0]:window[-1][1]].strip()
+            if piece:
+                pieces.append(DocumentChunk(
+                    content=piece,
+                    metadata={**chunk.metadata, "part": len(pieces) + 1}
+                ))
+            if start + self.max_tokens >= len(offsets):
+                break
+        return pieces
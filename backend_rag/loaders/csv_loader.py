@@ -0,0 +1,54 @@
+import csv
+from typing import Iterator, List
+from .base import BaseLoader, DocumentChunk
+
+class CsvLoader(BaseLoader):
+    """
+    Streams a CSV file row by row. Rows are rendered as "column: value" lines so every chunk
+    is self-describing, and grouped until a chunk reaches about `chunk_chars` characters
+    (never splitting a row). Chunk metadata records the 1-based data row range it covers.
+    """
+
+    def __init__(self, chunk_chars: int = 500):
+        self.chunk_chars = chunk_chars
+
+    def stream(self, file_path: str) -> Iterator[DocumentChunk]:
+        with open(file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            header = [h.strip() or f"column_{i + 1}" for i, h in enumerate(header)]
+
+            rows: List[str] = []
+            size = 0
+            row_start = row_end = 1
+            for row_num, row in enumerate(reader, start=1):
+                text = self._render(header, row)
+                if not text:
+                    continue
+                if not rows:
+                    row_start = row_num
+                rows.append(text)
+                row_end = row_num
+                size += len(text) + 2
+                if size >= self.chunk_chars:
+                    yield self._chunk(file_path, rows, row_start, row_end)
+                    rows, size = [], 0
+            if rows:
+                yield self._chunk(file_path, rows, row_start, row_end)
+
+    def _render(self, header: List[str], row: List[str]) -> str:
+        fields = []
+        for i, value in enumerate(row):
+            value = value.strip()
+            if value:
+                name = header[i] if i < len(header) else f"column_{i + 1}"
+                fields.append(f"{name}: {value}")
+        return "\n".join(fields)
+
+    def _chunk(self, file_path: str, rows: List[str], row_start: int, row_end: int) -> DocumentChunk:
+        return DocumentChunk(
+            content="\n\n".join(rows),
+            metadata={"source": file_path, "row_start": row_start, "row_end": row_end}
+        )
@@ -1,13 +1,18 @@
 import os
-from typing import List
+from typing import Iterator, Optional
 from .base import DocumentChunk
 from .pdf_loader import PDFLoader
 from .docx_loader import DocxLoader
 from .txt_loader import TxtLoader
+from .csv_loader import CsvLoader
+from .chunker import TokenChunker
 
-def process_file(file_path: str) -> List[DocumentChunk]:
+def process_file(file_path: str, chunker: Optional[TokenChunker] = None) -> Iterator[DocumentChunk]:
     """
     Factory method to parse a file based on its extension using modular loaders.
+    Chunks are produced lazily; wrap in list() if the whole document is needed at once.
+    With a chunker, every chunk is re-split to the embedding model's token budget.
+    Unreadable or corrupt files raise from the loader instead of yielding nothing.
     """
     ext = os.path.splitext(file_path)[1].lower()
     
@@ -16,12 +21,14 @@ def process_file(file_path: str) -> List[DocumentChunk]:
         loader = PDFLoader()
     elif ext == '.docx':
         loader = DocxLoader()
-    elif ext in ['.txt', '.md', '.csv']:
+    elif ext in ['.txt', '.md']:
         loader = TxtLoader()
+    elif ext == '.csv':
+        loader = CsvLoader()
     else:
-        print(f"Unsupported file extension: {ext}")
-        return []
+        raise ValueError(f"Unsupported file extension: {ext}")
         
-    chunks = loader.load(file_path)
-    # Could add global post-processing here (e.g. forced overlap)
+    chunks = loader.stream(file_path)
+    if chunker is not None:
+        chunks = chunker.rechunk(chunks)
     return chunks
@@ -1,31 +1,51 @@
-from typing import List
+from typing import Iterator
 from .base import BaseLoader, DocumentChunk
 
 class TxtLoader(BaseLoader):
-    def load(self, file_path: str) -> List[DocumentChunk]:
-        chunks = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            # Split by double newlines to paragraph level roughly
-            paragraphs = content.split('\n\n')
-            
-            chunk_text = ""
-            # Simple chunking strategy for txt
-            for i, p in enumerate(paragraphs):
-                p = p.strip()
-                if not p:
+    """
+    Streams plain text / Markdown line by line, grouping blank-line separated paragraphs
+    into chunks of roughly `chunk_chars`. A paragraph that runs past `max_paragraph_chars`
+    without a blank line (log exports, minified dumps) is cut there, so memory stays bounded
+    by the chunk size rather than the file size.
+    """
+
+    def __init__(self, chunk_chars: int = 500, max_paragraph_chars: int = 4000):
+        self.chunk_chars = chunk_chars
+        self.max_paragraph_chars = max_paragraph_chars
+
+    def stream(self, file_path: str) -> Iterator[DocumentChunk]:
+        chunk_text = ""
+        for p in self._paragraphs(file_path):
+            chunk_text += p + "\n\n"
+            # If chunk exceeds ~500 chars, make it a new chunk
+            if len(chunk_text) > self.chunk_chars:
+                yield DocumentChunk(
+                    content=chunk_text.strip(),
+                    metadata={"source": file_path}
+                )
+                chunk_text = ""
+        if chunk_text.strip():
+            yield DocumentChunk(
+                content=chunk_text.strip(),
+                metadata={"source": file_path}
+            )
+
+    def _paragraphs(self, file_path: str) -> Iterator[str]:
+        lines = []
+        size = 0
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            # Bounded reads: a single huge line is consumed in max_paragraph_chars pieces
+            for line in iter(lambda: f.readline(self.max_paragraph_chars), ''):
+                line = line.rstrip("\r\n")
+                if not line.strip():
+                    if lines:
+                        yield "\n".join(lines).strip()
+                        lines, size = [], 0
                     continue
-                chunk_text += p + "\n\n"
-                # If chunk exceeds ~500 chars, make it a new chunk
-                if len(chunk_text) > 500 or i == len(paragraphs) - 1:
-                    chunks.append(DocumentChunk(
-                        content=chunk_text.strip(),
-                        metadata={"source": file_path}
-                    ))
-                    chunk_text = ""
-        except Exception as e:
-            print(f"Error loading TXT {file_path}: {e}")
-            
-        return chunks
+                lines.append(line)
+                size += len(line) + 1
+                if size >= self.max_paragraph_chars:
+                    yield "\n".join(lines).strip()
+                    lines, size = [], 0
+        if lines:
+            yield "\n".join(lines).strip()
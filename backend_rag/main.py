@@ -1,15 +1,29 @@
 import os
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+import sys
+# Modules shared with the backend live in <repo>/shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 import uvicorn
 import pydantic
 
 from core.retriever import HybridRetriever
+from core.naming import InvalidCollectionName, validate_collection_name
+from core.embedding_backends import EMBEDDING_BACKENDS
+from core.model_switch import IndexGenerations, ModelSwitch
+from core.reranker import CrossEncoderReranker
+from core.worker_pool import WorkerPool, PoolSaturated
+from core.ingest_queue import IngestQueue
+from shared.metrics import REGISTRY, CONTENT_TYPE, CallbackMetric, Counter, RequestMetricsMiddleware
+from shared.tracing import TracingMiddleware
+from shared.uploads import save_upload, UploadTooLarge
 from loaders.document_parser import process_file
+from loaders.chunker import TokenChunker
 import core.model_manager as model_manager
 import asyncio
-from fastapi.responses import StreamingResponse
+import uuid
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 import json
 
 app = FastAPI(title="EduAIHub Local RAG Microservice", version="1.0.0")
@@ -20,31 +34,248 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read per-stage timings and correlate its logs with ours
+    expose_headers=["Server-Timing", "X-Request-ID"],
+)
+app.add_middleware(RequestMetricsMiddleware)
+# Request IDs and Server-Timing on every response; requests slower than RAG_TRACE_SLOW_MS
+# (0 = off) are appended with all their spans to RAG_TRACE_FILE
+app.add_middleware(
+    TracingMiddleware,
+    service="backend_rag",
+    slow_ms=float(os.environ.get("RAG_TRACE_SLOW_MS", "0")),
+    trace_file=os.environ.get("RAG_TRACE_FILE", "./logs/slow_traces.jsonl")
 )
 
-# Global singleton for our hybrid retriever
+# Global singleton for our hybrid retriever; replaced by a model switch cut-over
 retriever: Optional[HybridRetriever] = None
+RAG_DB_ROOT = "./rag_db"
+generations: Optional[IndexGenerations] = None
+model_switch: Optional[ModelSwitch] = None
+
+# Blocking retriever calls run here so the event loop stays free for /health, SSE streams, etc.
+pool = WorkerPool(
+    # Workers mostly wait on the embedding batcher, so several per core keep batches full
+    max_workers=int(os.environ.get("RAG_QUERY_WORKERS", "16")),
+    max_queue=int(os.environ.get("RAG_QUERY_QUEUE", "32"))
+)
+
+# Durable upload processing; uploaded files wait in UPLOAD_DIR until their job finishes
+UPLOAD_DIR = "./temp_uploads"
+MAX_UPLOAD_BYTES = int(os.environ.get("RAG_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+ingest_queue: Optional[IngestQueue] = None
+
+# Chunks are pulled from the loader and indexed this many at a time, so a large file never
+# has to be fully parsed (or held in memory) before embedding starts
+INGEST_BATCH_CHUNKS = int(os.environ.get("RAG_INGEST_BATCH_CHUNKS", "256"))
+INGEST_CHUNKS = Counter("rag_ingest_chunks_total", "Chunks indexed by ingestion jobs")
+
+# Federated queries answer without collections that take longer than this (0 waits for all)
+COLLECTION_TIMEOUT_MS = int(os.environ.get("RAG_COLLECTION_TIMEOUT_MS", "2000"))
+# Collections one federated query may search; longer explicit lists are rejected and
+# all_collections searches the first ones listed
+MAX_QUERY_COLLECTIONS = int(os.environ.get("RAG_MAX_QUERY_COLLECTIONS", "16"))
+
+# Optional cross-encoder rerank of the first-stage candidates. RAG_RERANK=1 turns it on for
+# requests that do not say; the model loads in the background at startup in that case.
+reranker = CrossEncoderReranker(
+    model_name=os.environ.get("RAG_RERANK_MODEL", "BAAI/bge-reranker-base"),
+    batch_size=int(os.environ.get("RAG_RERANK_BATCH_SIZE", "16"))
+)
+RERANK_DEFAULT = os.environ.get("RAG_RERANK", "0") == "1"
+RERANK_CANDIDATES = int(os.environ.get("RAG_RERANK_CANDIDATES", "20"))
+RERANK_BUDGET_MS = int(os.environ.get("RAG_RERANK_BUDGET_MS", "300"))
+
+def make_chunker() -> Optional[TokenChunker]:
+    # Token-aware re-splitting needs the model's fast tokenizer; without it loader chunks are used as-is
+    tokenizer = retriever.get_tokenizer()
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        return None
+    max_tokens, overlap_tokens = retriever.chunk_budget()
+    return TokenChunker(tokenizer, max_tokens, overlap_tokens)
+
+def process_ingest_job(job: dict, update):
+    totals = {"chunks": 0, "added": 0, "duplicates_skipped": 0, "embeddings_reused": 0, "embeddings_computed": 0}
+    batch = []
+    # Replacing a file: chunks of the new version that are already indexed stay put, the
+    # previous version's other chunks are deleted once the new one is fully in
+    seen_ids = set() if job.get("mode") == "replace" else None
+
+    def flush():
+        stats = retriever.add_documents(batch, source_name=job["filename"], collection_name=job["collection_name"], seen_ids=seen_ids)
+        for key in totals:
+            totals[key] += stats[key]
+        INGEST_CHUNKS.inc(stats["added"])
+        batch.clear()
+        update(status="embedding", chunks_indexed=totals["added"], stats=totals)
+
+    for chunk in process_file(job["file_path"], chunker=make_chunker()):
+        # Loaders record the on-disk path; files are listed by their uploaded name
+        chunk.metadata["source"] = job["filename"]
+        batch.append(chunk)
+        if len(batch) >= INGEST_BATCH_CHUNKS:
+            flush()
+    if batch:
+        flush()
+    if not totals["chunks"] and os.path.getsize(job["file_path"]) > 0:
+        # Marking it indexed would leave a file that can never be found
+        raise ValueError(f"No text could be extracted from {job['filename']}")
+    if seen_ids is not None:
+        if not seen_ids:
+            # Swapping in nothing would delete every chunk of the indexed version
+            raise ValueError(f"Replacement for {job['filename']} produced no chunks, the indexed version was kept")
+        totals["replaced"] = retriever.delete_source(job["collection_name"], job["filename"], keep_ids=seen_ids) or 0
+    retriever.set_source_info(job["collection_name"], job["filename"], file_size=job.get("file_size"), sha256=job.get("content_hash"))
+    update(chunks_total=totals["chunks"], stats=totals)
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=429,
+        content={"status": "error", "detail": "RAG service is busy, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(InvalidCollectionName)
+async def invalid_collection_name_handler(request: Request, exc: InvalidCollectionName):
+    return JSONResponse(status_code=400, content={"status": "error", "detail": str(exc)})
+
+def check_collection_name(name: str):
+    # Before any work is queued or a path is built from the name
+    try:
+        validate_collection_name(name)
+    except InvalidCollectionName as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Read at scrape time from state the service keeps anyway
+CallbackMetric("rag_ingest_queue_jobs", "Ingestion jobs by status",
+               lambda: {(status,): n for status, n in ingest_queue.depth().items()} if ingest_queue else {},
+               labelnames=("status",))
+CallbackMetric("rag_worker_pool_calls", "Retriever calls running or waiting on the worker pool",
+               lambda: {("in_flight",): pool.stats()["in_flight"], ("queued",): pool.stats()["queued"]},
+               labelnames=("state",))
+CallbackMetric("rag_worker_pool_rejected_total", "Calls rejected with 429 because the pool was full",
+               lambda: {(): pool.rejected}, kind="counter")
+
+def _cache_lookups():
+    if retriever is None:
+        return {}
+    values = {}
+    for name, stats in retriever.get_cache_stats().items():
+        values[(name, "hit")] = stats["hits"]
+        values[(name, "miss")] = stats["misses"]
+    return values
+
+CallbackMetric("rag_cache_requests_total", "Query embedding and result cache lookups", _cache_lookups,
+               kind="counter", labelnames=("cache", "result"))
+CallbackMetric("rag_resident_collection_bytes", "Estimated heap footprint of resident collections",
+               lambda: {(): retriever.get_memory_stats()["resident_bytes"]} if retriever else {})
+
+def build_retriever(embed_model_name: str, embedding_backend: str, db_path: str) -> HybridRetriever:
+    return HybridRetriever(
+        embed_model_name=embed_model_name,
+        db_path=db_path,
+        # Shared by every index generation, so switching back to a model re-uses its embeddings
+        embedding_store_path=os.path.join(RAG_DB_ROOT, "embedding_store.db"),
+        # Collections load lazily and are evicted LRU once their in-memory corpora exceed this
+        memory_budget_mb=int(os.environ.get("RAG_MEMORY_BUDGET_MB", "1024")),
+        # Query encodes arriving within this window are run as one batch
+        embed_batch_size=int(os.environ.get("RAG_EMBED_BATCH_SIZE", "32")),
+        embed_max_wait_ms=float(os.environ.get("RAG_EMBED_MAX_WAIT_MS", "5")),
+        # Ingest chunks are re-split to this many model tokens, overlapping by RAG_CHUNK_OVERLAP_TOKENS
+        chunk_tokens=int(os.environ.get("RAG_CHUNK_TOKENS", "512")),
+        chunk_overlap_tokens=int(os.environ.get("RAG_CHUNK_OVERLAP_TOKENS", "64")),
+        doc_batch_size=int(os.environ.get("RAG_DOC_BATCH_SIZE", "64")),
+        # torch, onnx or onnx-int8 (ONNX Runtime, dynamically quantized); exports are cached on disk
+        embedding_backend=embedding_backend,
+        # chroma, or mmap: memory-mapped float16/int8 matrices (RAG_DENSE_DTYPE) searched in-process,
+        # with an IVF index for collections of at least RAG_DENSE_IVF_MIN_ROWS chunks (0 = always exact)
+        dense_store=os.environ.get("RAG_DENSE_STORE", "chroma"),
+        dense_dtype=os.environ.get("RAG_DENSE_DTYPE", "float16"),
+        dense_ivf_min_rows=int(os.environ.get("RAG_DENSE_IVF_MIN_ROWS", "0")),
+        dense_nprobe=int(os.environ.get("RAG_DENSE_NPROBE", "8"))
+    )
+
+def install_retriever(new_retriever: HybridRetriever):
+    global retriever
+    retriever = new_retriever
 
 @app.on_event("startup")
 async def startup_event():
-    global retriever
+    global retriever, generations
     # Initialize the hybrid retriever with a local embedding model
     print("Loading RAG Retriever... (This may take a moment to load embedding weights)")
-    retriever = HybridRetriever(
-        embed_model_name="BAAI/bge-m3", 
-        db_path="./rag_db"
-    )
+    generations = IndexGenerations(RAG_DB_ROOT)
+    # Shadow indexes of a switch that did not finish are of no use after a restart
+    generations.cleanup()
+    active = generations.active()
+    if active:
+        retriever = build_retriever(active["embed_model_name"], active["embedding_backend"], active["path"])
+    else:
+        retriever = build_retriever("BAAI/bge-m3", os.environ.get("RAG_EMBED_BACKEND", "torch"), RAG_DB_ROOT)
     print("RAG Retriever initialized.")
 
+    global ingest_queue
+    ingest_queue = IngestQueue(
+        "./ingest_queue.db",
+        handler=process_ingest_job,
+        workers=int(os.environ.get("RAG_INGEST_WORKERS", "2")),
+        max_attempts=int(os.environ.get("RAG_INGEST_MAX_ATTEMPTS", "3"))
+    )
+    ingest_queue.start()
+
+    if RERANK_DEFAULT:
+        reranker.load_async()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    pool.shutdown()
+    if ingest_queue:
+        ingest_queue.stop()
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "ready": retriever is not None}
+    return {
+        "status": "ok",
+        "ready": retriever is not None,
+        "embedding_backend": retriever.embedding_backend if retriever else None,
+        "pool": pool.stats(),
+        "embedding_batcher": retriever.query_batcher.stats() if retriever else None,
+        "document_embedding": retriever.get_embed_stats() if retriever else None,
+        "rerank": reranker.stats()
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus text format. A plain def: FastAPI runs it on its own thread pool, so scrapes
+    keep working while the retriever pool is saturated.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/api/v1/rag/collections")
 async def list_collections():
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
-    return {"status": "success", "data": retriever.get_collections()}
+    return {"status": "success", "data": await pool.run(retriever.get_collections)}
+
+@app.get("/api/v1/rag/memory")
+async def memory_stats():
+    """
+    Reports the memory budget and the estimated footprint of every resident collection.
+    """
+    if not retriever:
+        raise HTTPException(status_code=500, detail="Retriever not initialized")
+    return {"status": "success", "data": retriever.get_memory_stats()}
+
+@app.get("/api/v1/rag/cache")
+async def cache_stats():
+    """
+    Hit/miss counters of the query-embedding and result caches.
+    """
+    if not retriever:
+        raise HTTPException(status_code=500, detail="Retriever not initialized")
+    return {"status": "success", "data": retriever.get_cache_stats()}
 
 class CreateCollectionReq(pydantic.BaseModel):
     name: str
@@ -53,77 +284,198 @@ class CreateCollectionReq(pydantic.BaseModel):
 async def create_collection(req: CreateCollectionReq):
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
-    retriever.create_collection(req.name)
+    check_collection_name(req.name)
+    await pool.run(retriever.create_collection, req.name)
     return {"status": "success", "message": f"Collection '{req.name}' created/ready"}
 
 @app.delete("/api/v1/rag/collections/{name}")
 async def delete_collection(name: str):
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
-    retriever.delete_collection(name)
+    check_collection_name(name)
+    await pool.run(retriever.delete_collection, name)
     return {"status": "success", "message": f"Collection '{name}' deleted"}
 
 @app.get("/api/v1/rag/collections/{name}/files")
 async def get_collection_files(name: str):
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
-    files = retriever.get_collection_files(name)
+    check_collection_name(name)
+    files = await pool.run(retriever.get_collection_files, name)
     return {"status": "success", "data": files}
 
+@app.delete("/api/v1/rag/collections/{name}/files/{filename}")
+async def delete_collection_file(name: str, filename: str):
+    """
+    Removes one file's chunks from the collection; the rest of the collection is untouched.
+    """
+    if not retriever:
+        raise HTTPException(status_code=500, detail="Retriever not initialized")
+    check_collection_name(name)
+    removed = await pool.run(retriever.delete_source, name, filename)
+    if removed is None:
+        raise HTTPException(status_code=404, detail=f"File '{filename}' not found in collection '{name}'")
+    return {"status": "success", "message": f"File '{filename}' deleted", "chunks_deleted": removed}
+
+@app.put("/api/v1/rag/collections/{name}/files/{filename}")
+async def replace_collection_file(name: str, filename: str, file: UploadFile = File(...)):
+    """
+    Queues a new version of a file. Once it is indexed, chunks only the old version had are
+    deleted; unchanged chunks are kept without re-embedding.
+    """
+    if not retriever:
+        raise HTTPException(status_code=500, detail="Retriever not initialized")
+    check_collection_name(name)
+    # The stored name decides the source the job replaces
+    file.filename = filename
+    return await enqueue_upload(file, name, mode="replace")
+
 class ConfigUpdateReq(pydantic.BaseModel):
     embed_model_name: str
+    embedding_backend: Optional[str] = None  # torch / onnx / onnx-int8, unchanged if omitted
 
 @app.post("/api/v1/rag/config")
-async def update_config(req: ConfigUpdateReq, bg_tasks: BackgroundTasks):
+async def update_config(req: ConfigUpdateReq):
+    """
+    Starts re-indexing every collection under the new model next to the live index, which keeps
+    serving until the switch swaps over. Poll GET /api/v1/rag/config/switch for progress.
+    """
+    global model_switch
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
-    # Doing this in background so we don't block the HTTP response on a long delete/download
-    bg_tasks.add_task(retriever.reset_database, req.embed_model_name)
-    return {"status": "success", "message": f"Model switch to {req.embed_model_name} initiated. DB is wiping."}
+    if req.embedding_backend and req.embedding_backend not in EMBEDDING_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"embedding_backend must be one of {', '.join(EMBEDDING_BACKENDS)}")
+    if model_switch and model_switch.running:
+        raise HTTPException(status_code=409, detail="A model switch is already in progress")
+    model_switch = ModelSwitch(
+        retriever, generations, build_retriever, install_retriever,
+        req.embed_model_name, req.embedding_backend or retriever.embedding_backend
+    )
+    model_switch.start()
+    return {"status": "success", "message": f"Model switch to {req.embed_model_name} initiated. Re-indexing in background.",
+            "data": model_switch.progress()}
+
+@app.get("/api/v1/rag/config/switch")
+async def get_model_switch():
+    if not model_switch:
+        return {"status": "success", "data": None}
+    return {"status": "success", "data": model_switch.progress()}
+
+@app.delete("/api/v1/rag/config/switch")
+async def cancel_model_switch():
+    if not model_switch or not model_switch.cancel():
+        raise HTTPException(status_code=409, detail="No cancellable model switch in progress")
+    return {"status": "success", "message": "Model switch cancellation requested"}
+
+async def enqueue_upload(file: UploadFile, collection_name: str, mode: str = "add") -> dict:
+    if not retriever or not ingest_queue:
+        raise HTTPException(status_code=500, detail="Retriever not initialized")
+    check_collection_name(collection_name)
+    
+    # Stream the file to disk until its job is done; the job id keeps concurrent uploads of the same name apart
+    job_id = uuid.uuid4().hex
+    try:
+        stored = await save_upload(file, UPLOAD_DIR, f"{job_id}_{os.path.basename(file.filename)}", MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+        
+    # A plain SQLite insert: it does not wait behind searches in the worker pool, and a failed
+    # submit leaves no file behind that no job would ever pick up
+    try:
+        job = await asyncio.to_thread(
+            ingest_queue.submit, job_id, collection_name, file.filename, stored.path,
+            file_size=stored.size, content_hash=stored.sha256, mode=mode
+        )
+    except Exception:
+        os.remove(stored.path)
+        raise
+    return {"status": job["status"], "job_id": job_id, "filename": file.filename, "message": "Document is queued for parsing and vectorization."}
 
 @app.post("/api/v1/rag/upload")
 async def upload_document(
     file: UploadFile = File(...), 
-    collection_name: str = Form("default"),
-    bg_tasks: BackgroundTasks = BackgroundTasks()
+    collection_name: str = Form("default")
 ):
     """
-    Streamlines document parsing and immediate addition to local DB
+    Stores the upload and queues it for parsing and vectorization. Poll the returned job_id for progress.
     """
-    if not retriever:
+    return await enqueue_upload(file, collection_name)
+
+@app.get("/api/v1/rag/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """
+    Status of one ingestion job: queued, parsing, embedding, indexed or failed, with chunk counts.
+    """
+    if not ingest_queue:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
-    
-    # Save file temporarily
-    os.makedirs("./temp_uploads", exist_ok=True)
-    file_path = f"./temp_uploads/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-        
-    def process_and_add():
-        chunks = process_file(file_path)
-        if chunks:
-            # We add documents implicitly as dictionaries or objects
-            retriever.add_documents(chunks, source_name=file.filename, collection_name=collection_name)
-        # Cleanup
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            
-    bg_tasks.add_task(process_and_add)
-    return {"status": "processing", "filename": file.filename, "message": "Document is being parsed and vectorized in the background."}
+    job = await pool.run(ingest_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "success", "data": job}
+
+@app.get("/api/v1/rag/jobs")
+async def list_ingest_jobs(collection_name: Optional[str] = None, limit: int = 100):
+    if not ingest_queue:
+        raise HTTPException(status_code=500, detail="Retriever not initialized")
+    jobs = await pool.run(ingest_queue.list, collection_name, limit)
+    return {"status": "success", "data": jobs}
 
 class QueryRequest(pydantic.BaseModel):
     query: str
     top_k: int = 3
-    alpha: float = 0.5 # 0.0 pure dense, 1.0 pure sparse
+    alpha: float = 0.5 # weight of the dense leg: 0.0 pure sparse (BM25), 1.0 pure dense
     collection_name: str = "default"
+    fusion: str = "weighted" # "weighted" score mix or "rrf" (reciprocal rank fusion)
+    # Federated search: several collections (or every collection) merged into one top-k;
+    # collection_name is ignored when either is set
+    collection_names: Optional[List[str]] = None
+    all_collections: bool = False
+    timeout_ms: Optional[int] = None # per-collection deadline, RAG_COLLECTION_TIMEOUT_MS by default
+    # Cross-encoder rerank of the best rerank_candidates first-stage hits down to top_k, cut
+    # short after rerank_budget_ms (unscored hits keep their first-stage order)
+    rerank: Optional[bool] = None
+    rerank_candidates: Optional[int] = None
+    rerank_budget_ms: Optional[int] = None
 
 @app.post("/api/v1/rag/query")
 async def query_knowledge(req: QueryRequest):
     if not retriever:
         raise HTTPException(status_code=500, detail="Retriever not initialized")
     
-    results = retriever.search(req.query, top_k=req.top_k, alpha=req.alpha, collection_name=req.collection_name)
-    return {"status": "success", "data": results}
+    if req.fusion not in ("weighted", "rrf"):
+        raise HTTPException(status_code=400, detail="fusion must be 'weighted' or 'rrf'")
+    rerank = req.rerank if req.rerank is not None else RERANK_DEFAULT
+    # The reranker picks top_k out of a wider first-stage candidate set
+    n_candidates = max(req.top_k, req.rerank_candidates or RERANK_CANDIDATES) if rerank else req.top_k
+    response = {"status": "success"}
+    if req.collection_names or req.all_collections:
+        names = req.collection_names or []
+        if len(set(names)) > MAX_QUERY_COLLECTIONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_QUERY_COLLECTIONS} collections can be searched at once")
+        for name in names:
+            check_collection_name(name)
+        if req.all_collections:
+            names = [c["name"] for c in await pool.run(retriever.get_collections)]
+        timeout_ms = req.timeout_ms if req.timeout_ms is not None else COLLECTION_TIMEOUT_MS
+        federated = await pool.run(
+            retriever.search_many, req.query, names,
+            top_k=n_candidates, alpha=req.alpha, fusion=req.fusion, timeout=timeout_ms / 1000.0 if timeout_ms > 0 else None,
+            max_collections=MAX_QUERY_COLLECTIONS
+        )
+        results = federated["results"]
+        response["collections"] = federated["collections"]
+    else:
+        check_collection_name(req.collection_name)
+        results = await pool.run(
+            retriever.search, req.query,
+            top_k=n_candidates, alpha=req.alpha, collection_name=req.collection_name, fusion=req.fusion
+        )
+
+    if rerank:
+        budget_ms = req.rerank_budget_ms if req.rerank_budget_ms is not None else RERANK_BUDGET_MS
+        results = await pool.run(reranker.rerank, req.query, results, req.top_k, budget_ms)
+    response["data"] = results
+    return response
 
 # --- Model Manager Endpoints ---
 
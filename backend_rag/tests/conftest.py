@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# The service runs from backend_rag/ with the repo root on the path for `shared`
+BACKEND_RAG = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_RAG)
+sys.path.insert(0, os.path.dirname(BACKEND_RAG))
+
+# Also keeps transformers from trying to download a tokenizer for the fake model names
+from benchmarks.rag_suite import FakeEmbeddingFunction
+from core.retriever import HybridRetriever
+
+
+@pytest.fixture
+def make_retriever(tmp_path):
+    """
+    Opens retrievers on the offline fake embedding, with ModelSwitch's make_retriever
+    signature (model, backend, db_path). All of them share one embedding store.
+    """
+    opened = []
+
+    def make(embed_model_name="fake-a", embedding_backend="torch", db_path=None, **options):
+        retriever = HybridRetriever(
+            embed_model_name=embed_model_name,
+            embedding_backend=embedding_backend,
+            db_path=db_path or str(tmp_path / "rag_db"),
+            embedding_store_path=str(tmp_path / "embedding_store.db"),
+            embedding_fn=FakeEmbeddingFunction(64),
+            **options,
+        )
+        opened.append(retriever)
+        return retriever
+
+    yield make
+    for retriever in opened:
+        retriever.close()
+
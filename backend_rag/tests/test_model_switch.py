@@ -0,0 +1,105 @@
+import threading
+import time
+
+from core.model_switch import IndexGenerations, ModelSwitch
+from loaders.base import DocumentChunk
+
+COLLECTION = "notes"
+
+
+def chunks_for(source_name, texts):
+    return [DocumentChunk(text, {"source": source_name}) for text in texts]
+
+
+def per_source(retriever, collection_name):
+    """
+    { source: sorted live chunk texts } read from the resident corpus, not the manifest.
+    """
+    _, _, chunks, metas = retriever._snapshot(collection_name)
+    contents = {}
+    for content, meta in zip(chunks, metas):
+        if content is not None:
+            contents.setdefault(meta["source"], []).append(content)
+    return {source: sorted(texts) for source, texts in contents.items()}
+
+
+def test_writes_during_switch_reach_the_new_generation(tmp_path, make_retriever):
+    generations = IndexGenerations(str(tmp_path / "rag_db"))
+    live = {"retriever": make_retriever("fake-a", db_path=generations.new_generation())}
+    source = live["retriever"]
+    for s in range(6):
+        source.add_documents(chunks_for(f"file{s}.txt", [f"file {s} paragraph {i} about topic {i % 7}" for i in range(80)]),
+                             f"file{s}.txt", COLLECTION)
+        source.set_source_info(COLLECTION, f"file{s}.txt", file_size=1000 + s, sha256=f"sha-{s}")
+    expected = per_source(source, COLLECTION)
+
+    # What the source and the shadow hold at the cut-over, taken while writes are frozen
+    at_swap = {}
+
+    def on_swap(shadow):
+        at_swap["source_files"] = source.get_collection_files(COLLECTION)
+        at_swap["shadow_files"] = shadow.get_collection_files(COLLECTION)
+        at_swap["source_chunks"] = per_source(source, COLLECTION)
+        at_swap["shadow_chunks"] = per_source(shadow, COLLECTION)
+        live["retriever"] = shadow
+
+    switch = ModelSwitch(source, generations, make_retriever, on_swap, "fake-b", "torch",
+                         batch_chunks=16, grace_seconds=60)
+    writes_while_running = 0
+    done = threading.Event()
+
+    def writer():
+        # Uploads, single-file deletes and replacements, all aimed at the old retriever
+        nonlocal writes_while_running
+        i = 0
+        while not done.is_set():
+            running = switch.status["state"] == "running"
+            name = f"late{i}.txt"
+            texts = [f"late upload {i} part {p}" for p in range(3)]
+            source.add_documents(chunks_for(name, texts), name, COLLECTION)
+            expected[name] = sorted(texts)
+            if i % 3 == 1:
+                source.delete_source(COLLECTION, f"late{i - 1}.txt")
+                del expected[f"late{i - 1}.txt"]
+            if i < 6:
+                replaced = f"file{i}.txt"
+                texts = ([f"file {i} paragraph {p} about topic {p % 7}" for p in range(0, 80, 2)]
+                         + [f"file {i} revised paragraph {p}" for p in range(5)])
+                seen_ids = set()
+                source.add_documents(chunks_for(replaced, texts), replaced, COLLECTION, seen_ids=seen_ids)
+                source.delete_source(COLLECTION, replaced, keep_ids=seen_ids)
+                expected[replaced] = sorted(texts)
+                source.set_source_info(COLLECTION, replaced, file_size=2000 + i, sha256=f"sha-{i}-v2")
+            writes_while_running += running
+            i += 1
+            time.sleep(0.005)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        switch.start()
+        deadline = time.time() + 60
+        while switch.running and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        done.set()
+        thread.join()
+
+    assert switch.status["state"] == "completed", switch.status
+    assert writes_while_running > 0
+    assert live["retriever"] is not source
+    assert live["retriever"].embed_model_name == "fake-b"
+    assert generations.active()["path"] == live["retriever"].db_path
+
+    assert at_swap["shadow_files"] == at_swap["source_files"]
+    assert at_swap["shadow_chunks"] == at_swap["source_chunks"]
+    # The replacements that ran before the cut-over were carried over, not the old versions
+    revised = {f["filename"]: f for f in at_swap["shadow_files"] if f["sha256"] and f["sha256"].endswith("-v2")}
+    assert revised
+    for filename in revised:
+        assert len(at_swap["shadow_chunks"][filename]) == 45
+
+    # Writes that raced the cut-over were forwarded, so the new retriever has all of them
+    assert per_source(live["retriever"], COLLECTION) == expected
+    final = live["retriever"].get_collection_files(COLLECTION)
+    assert {f["filename"]: f["chunks"] for f in final} == {name: len(texts) for name, texts in expected.items()}
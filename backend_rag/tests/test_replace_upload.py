@@ -0,0 +1,78 @@
+import pytest
+
+import main
+
+COLLECTION = "handbook"
+FILENAME = "handbook.txt"
+
+
+def paragraph(name):
+    # Longer than the txt loader's chunk size, so every paragraph becomes its own chunk
+    return " ".join([f"{name}"] + [f"{name}word{i}" for i in range(60)])
+
+
+def ingest(path, paragraphs, mode):
+    path.write_text("\n\n".join(paragraph(p) for p in paragraphs), encoding="utf-8")
+    job = {"collection_name": COLLECTION, "filename": FILENAME, "file_path": str(path), "mode": mode,
+           "file_size": path.stat().st_size, "content_hash": f"sha-{len(paragraphs)}"}
+    updates = {}
+    main.process_ingest_job(job, lambda **fields: updates.update(fields))
+    return updates["stats"]
+
+
+def live_chunks(retriever):
+    """
+    { chunk id: (row, content) } of the live chunks in the collection.
+    """
+    _, ids, chunks, _ = retriever._snapshot(COLLECTION)
+    return {doc_id: (row, chunks[row]) for doc_id, row in retriever.corpus_rows[COLLECTION].items()
+            if ids[row] is not None}
+
+
+@pytest.fixture
+def retriever(make_retriever, monkeypatch):
+    retriever = make_retriever()
+    monkeypatch.setattr(main, "retriever", retriever)
+    return retriever
+
+
+def test_replace_keeps_unchanged_chunks_and_drops_the_old_version(tmp_path, retriever):
+    old = ["alpha", "bravo", "charlie", "delta", "echo"]
+    new = ["alpha", "charlie", "echo", "foxtrot", "golf"]
+    stats = ingest(tmp_path / "v1.txt", old, mode="add")
+    assert stats["added"] == len(old)
+    before = live_chunks(retriever)
+    kept_ids = {doc_id for doc_id, (_, content) in before.items() if content.split()[0] in new}
+    assert len(kept_ids) == 3
+
+    stats = ingest(tmp_path / "v2.txt", new, mode="replace")
+    assert stats["added"] == 2
+    assert stats["duplicates_skipped"] == 3
+    assert stats["replaced"] == 2
+
+    after = live_chunks(retriever)
+    assert sorted(content.split()[0] for _, content in after.values()) == sorted(new)
+    # Unchanged chunks keep their id and their row: they were neither deleted nor re-embedded
+    for doc_id in kept_ids:
+        assert after[doc_id] == before[doc_id]
+    sparse = retriever.bm25_dict[COLLECTION]
+    for doc_id in set(before) - kept_ids:
+        assert doc_id not in after
+        assert sparse.is_deleted(before[doc_id][0])
+
+    files = retriever.get_collection_files(COLLECTION)
+    assert [(f["filename"], f["chunks"], f["sha256"]) for f in files] == [(FILENAME, len(new), "sha-5")]
+    for word in ("bravo", "delta"):
+        for alpha in (0.0, 1.0):
+            hits = retriever.search(f"{word} {word}word3", top_k=10, alpha=alpha, collection_name=COLLECTION)
+            assert all(not hit["content"].startswith(word) for hit in hits)
+    hits = retriever.search("golf golfword3", top_k=1, alpha=0.0, collection_name=COLLECTION)
+    assert hits[0]["content"].startswith("golf")
+
+
+def test_replace_with_no_chunks_keeps_the_indexed_version(tmp_path, retriever):
+    ingest(tmp_path / "v1.txt", ["alpha", "bravo"], mode="add")
+    before = live_chunks(retriever)
+    with pytest.raises(ValueError):
+        ingest(tmp_path / "empty.txt", [], mode="replace")
+    assert live_chunks(retriever) == before
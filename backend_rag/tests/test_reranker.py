@@ -0,0 +1,26 @@
+from core.reranker import CrossEncoderReranker
+
+
+class CountingModel:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.pairs.extend(pairs)
+        return [float(len(set(q.split()) & set(text.split()))) for q, text in pairs]
+
+
+def test_query_variants_share_cached_scores():
+    reranker = CrossEncoderReranker(batch_size=2)
+    reranker._model = model = CountingModel()
+    hits = [{"content": text, "metadata": {}} for text in ("blue whale size", "whale song", "red fox")]
+
+    first = reranker.rerank("blue whale", hits, top_k=3, budget_ms=10_000)
+    # Full-width letters and extra whitespace: the retriever serves this from the same result cache entry
+    second = reranker.rerank("  ｂｌｕｅ   whale ", hits, top_k=3, budget_ms=10_000)
+
+    assert len(model.pairs) == len(hits)
+    assert {q for q, _ in model.pairs} == {"blue whale"}
+    assert [h["content"] for h in second] == [h["content"] for h in first] == ["blue whale size", "whale song", "red fox"]
+    assert [h["rerank_score"] for h in second] == [2.0, 1.0, 0.0]
+    assert reranker.stats()["cached"] == len(hits)
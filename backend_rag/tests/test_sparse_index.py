@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+
+from core.sparse_index import SparseIndex
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+WORDS = [f"w{i}" for i in range(60)]
+
+
+def make_corpus(n_docs, seed=7):
+    rng = random.Random(seed)
+    # Skewed word choice so common terms get negative raw IDF and hit the epsilon floor
+    weights = [1.0 / (i + 1) for i in range(len(WORDS))]
+    return [rng.choices(WORDS, weights=weights, k=rng.randint(3, 30)) for _ in range(n_docs)]
+
+
+def assert_matches_bm25(index, corpus, deleted, queries, k=10):
+    live = [i for i in range(len(corpus)) if i not in deleted]
+    expected = rank_bm25.BM25Okapi([corpus[i] for i in live])
+    for query in queries:
+        reference = dict(zip(live, expected.get_scores(query)))
+        hits = index.top_k(query, k)
+        for doc_idx, score in hits:
+            assert doc_idx not in deleted
+            assert score == pytest.approx(reference[doc_idx], rel=1e-9, abs=1e-12)
+        # Ties may come back in any order, so compare the ranked scores, not the ids
+        matching = [s for i, s in reference.items() if set(query) & set(corpus[i])]
+        best = sorted(matching, reverse=True)[:k]
+        np.testing.assert_allclose([s for _, s in hits], best, rtol=1e-9, atol=1e-12)
+
+
+@pytest.fixture
+def queries():
+    rng = random.Random(11)
+    return [rng.sample(WORDS, rng.randint(1, 4)) for _ in range(25)] + [["w0", "w0", "w5"], ["missing"]]
+
+
+def test_top_k_matches_bm25okapi(tmp_path, queries):
+    corpus = make_corpus(300)
+    index = SparseIndex(str(tmp_path / "sparse"))
+    # Many small batches so segments get merged along the way
+    for start in range(0, len(corpus), 17):
+        index.add(corpus[start:start + 17])
+    assert index.n_docs == len(corpus)
+    assert_matches_bm25(index, corpus, set(), queries)
+
+
+def test_delete_and_reopen_match_bm25okapi(tmp_path, queries):
+    path = str(tmp_path / "sparse")
+    corpus = make_corpus(240)
+    index = SparseIndex(path)
+    index.add(corpus[:120])
+
+    deleted = set(range(0, 120, 3))
+    assert index.delete(sorted(deleted)) == len(deleted)
+    assert index.delete([0, 3]) == 0  # already gone
+    index.add(corpus[120:])
+    deleted |= {121, 150, 239}
+    index.delete([121, 150, 239])
+    assert all(index.is_deleted(i) for i in deleted)
+    assert_matches_bm25(index, corpus, deleted, queries)
+
+    reopened = SparseIndex.open(path)
+    assert reopened.n_docs == len(corpus)
+    assert all(reopened.is_deleted(i) for i in deleted)
+    assert_matches_bm25(reopened, corpus, deleted, queries)
+
+    # Writes after reopening keep extending the same corpus
+    extra = make_corpus(30, seed=3)
+    reopened.add(extra)
+    reopened.delete([5])
+    assert_matches_bm25(SparseIndex.open(path), corpus + extra, deleted | {5}, queries)
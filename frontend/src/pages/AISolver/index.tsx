@@ -166,6 +166,7 @@ interface Message {
     role: 'user' | 'assistant' | 'system';
     content: string;
     attachments?: { name: string; type: string; dataUrl?: string; content?: string }[];
+    citations?: { index: number; source: string; collection?: string; score?: number; snippet?: string }[];
 }
 
 interface ChatSession {
@@ -516,49 +517,14 @@ export default function AISolverPage() {
         // Pre-add empty bot message
         updateActiveSession([...updatedMessages, { id: botMsgId, role: 'assistant', content: '' }], newTitle);
 
-        try {
-            // STEP 1: RAG Pre-query if enabled
-            let ragContext = "";
-            let ragReferences = [];
-            if (ragEnabled && userMsgContent.trim()) {
-                try {
-                    const payload = {
-                        query: userMsgContent,
-                        top_k: globalSettings?.ragTopK || 3,
-                        alpha: globalSettings?.ragAlpha ?? 0.5,
-                        collection_name: ragCollection
-                    };
+        // One ID for the whole question; the backend forwards it to the RAG service and the model provider
+        const requestId = crypto.randomUUID();
 
-                    const ragRes = await fetch('http://127.0.0.1:8500/api/v1/rag/query', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify(payload)
-                    });
-                    if (ragRes.ok) {
-                        const ragData = await ragRes.json();
-                        if (ragData.data && ragData.data.length > 0) {
-                            ragContext = "\n\n=== 检索到的本地知识库信息 ===\n" + ragData.data.map((r: any, i: number) => {
-                                ragReferences.push(r.metadata?.source || "Unknown");
-                                return `[引用 ${i + 1}] (溯源: ${r.metadata?.source || "Unknown"})\n${r.content}\n`;
-                            }).join('---\n');
-                        } else {
-                            // Empty RAG response context
-                            ragContext = "\n\n=== 系统提示 ===\n未在知识库中检索到强相关信息，请基于自身知识谨慎作答，或直接告知用户未找到相关参考。";
-                        }
-                    }
-                } catch (e) {
-                    console.warn("RAG API Call Failed, falling back to base LLM", e);
-                }
-            }
-
-            // Generate system prompt
-            const baseSystemMsg = await generateSystemMessage(globalSettings as PromptSettings, user?.username);
-            const systemMsg = {
-                ...baseSystemMsg,
-                content: baseSystemMsg.content + ragContext
-            };
+        try {
+            // Generate system prompt; with RAG on, the backend retrieves and appends the
+            // knowledge base context to it itself, in the same request that streams the answer
+            const systemMsg = await generateSystemMessage(globalSettings as PromptSettings, user?.username);
+            const useRag = ragEnabled && !!userMsgContent.trim();
 
             const chatHistory = [systemMsg].concat(
                 updatedMessages.map(m => {
@@ -590,7 +556,8 @@ export default function AISolverPage() {
             const token = localStorage.getItem('eduaihub_token');
             const headers: Record<string, string> = {
                 'Content-Type': 'application/json',
-                'Authorization': `Bearer ${token}`
+                'Authorization': `Bearer ${token}`,
+                'X-Request-ID': requestId
             };
 
             // Inject Custom LLM Provider logic if active
@@ -599,7 +566,7 @@ export default function AISolverPage() {
                 if (activeLlm.baseUrl) headers['x-provider-baseurl'] = activeLlm.baseUrl;
             }
 
-            const res = await fetch('/api/v1/ai/chat/completions', {
+            const res = await fetch(useRag ? '/api/v1/ai/chat/rag' : '/api/v1/ai/chat/completions', {
                 method: 'POST',
                 headers,
                 body: JSON.stringify({
@@ -608,7 +575,15 @@ export default function AISolverPage() {
                     temperature: modelParams.temperature,
                     top_p: modelParams.top_p,
                     max_tokens: modelParams.max_tokens,
-                    stream: true
+                    stream: true,
+                    ...(useRag ? {
+                        rag: {
+                            query: userMsgContent,
+                            top_k: globalSettings?.ragTopK || 3,
+                            alpha: globalSettings?.ragAlpha ?? 0.5,
+                            collection_name: ragCollection
+                        }
+                    } : {})
                 })
             });
 
@@ -628,6 +603,15 @@ export default function AISolverPage() {
                     if (line.startsWith('data: ') && line !== 'data: [DONE]') {
                         try {
                             const data = JSON.parse(line.substring(6));
+                            // First event of a RAG answer: the chunks it is grounded on
+                            if (data.citations) {
+                                if (data.error) console.warn("RAG retrieval failed, answered by the base LLM");
+                                setSessions(prevSessions => prevSessions.map(s => s.id === activeSessionId ? {
+                                    ...s,
+                                    messages: s.messages.map(m => m.id === botMsgId ? { ...m, citations: data.citations } : m)
+                                } : s));
+                                continue;
+                            }
                             if (data.choices[0].delta.content) {
                                 currentResponse += data.choices[0].delta.content;
                                 // Need functional state update to always get latest messages in the loop
@@ -880,6 +864,17 @@ export default function AISolverPage() {
                                             )
                                         )}
                                     </div>
+                                    {/* Knowledge base sources of a RAG answer */}
+                                    {msg.citations && msg.citations.length > 0 && (
+                                        <div className="flex flex-wrap gap-2 mt-3 pt-3 border-t border-slate-200/60 dark:border-slate-700/60">
+                                            {msg.citations.map(c => (
+                                                <span key={c.index} title={c.snippet} className="flex items-center gap-1 px-2 py-1 bg-indigo-50 dark:bg-indigo-500/10 rounded-lg text-[11px] text-indigo-600 dark:text-indigo-300">
+                                                    <FileText className="w-3 h-3" />
+                                                    <span className="truncate max-w-[160px]">[{c.index}] {c.source}</span>
+                                                </span>
+                                            ))}
+                                        </div>
+                                    )}
                                 </div>
                             </motion.div>
                         ))}
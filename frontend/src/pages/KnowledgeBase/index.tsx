@@ -98,6 +98,22 @@ export default function KnowledgeBasePage() {
         }
     };
 
+    const handleDeleteFile = async (filename: string) => {
+        if (!activeCollection) return;
+        if (!window.confirm(`确认从集合 [${activeCollection}] 中删除文件 [${filename}] 的全部检索块？`)) return;
+        try {
+            const res = await fetch(`http://127.0.0.1:8500/api/v1/rag/collections/${activeCollection}/files/${encodeURIComponent(filename)}`, {
+                method: 'DELETE'
+            });
+            if (res.ok) {
+                fetchFiles(activeCollection);
+                fetchCollections();
+            }
+        } catch (e) {
+            console.error("Error deleting file", e);
+        }
+    };
+
     const handleFileSelect = async (e: React.ChangeEvent<HTMLInputElement>) => {
         if (!e.target.files || !activeCollection) return;
         const selectedFiles = Array.from(e.target.files);
@@ -256,7 +272,7 @@ export default function KnowledgeBasePage() {
                                                 key={file.filename}
                                                 initial={{ opacity: 0, scale: 0.95 }}
                                                 animate={{ opacity: 1, scale: 1 }}
-                                                className="bg-white dark:bg-slate-800 p-5 rounded-2xl border border-slate-200 dark:border-slate-700 shadow-sm flex items-start gap-4 hover:shadow-md transition-shadow"
+                                                className="group bg-white dark:bg-slate-800 p-5 rounded-2xl border border-slate-200 dark:border-slate-700 shadow-sm flex items-start gap-4 hover:shadow-md transition-shadow"
                                             >
                                                 <div className="p-3 bg-indigo-50 dark:bg-indigo-500/10 rounded-xl text-indigo-500">
                                                     <FileText className="w-6 h-6" />
@@ -269,6 +285,12 @@ export default function KnowledgeBasePage() {
                                                         被切割为 <span className="font-bold text-indigo-500">{file.chunks}</span> 个检索块
                                                     </p>
                                                 </div>
+                                                <button
+                                                    onClick={() => handleDeleteFile(file.filename)}
+                                                    className="opacity-0 group-hover:opacity-100 p-2 text-rose-500 hover:bg-rose-50 dark:hover:bg-rose-500/20 rounded-lg transition-all"
+                                                >
+                                                    <Trash2 className="w-4 h-4" />
+                                                </button>
                                             </motion.div>
                                         ))}
                                     </AnimatePresence>
@@ -794,20 +794,20 @@ export default function SettingsPage() {
                                                 </select>
                                                 <button
                                                     onClick={async () => {
-                                                        if (window.confirm(`即将以 '${settings.ragEmbedModel}' 为基座重置向量引擎。原有一切知识块都将灰飞烟灭！\n确认执行吗？`)) {
+                                                        if (window.confirm(`即将以 '${settings.ragEmbedModel}' 为基座在后台重建全部知识库索引，完成前旧索引照常服务，完成后自动切换。\n确认执行吗？`)) {
                                                             try {
                                                                 await fetch('http://127.0.0.1:8500/api/v1/rag/config', {
                                                                     method: 'POST',
                                                                     headers: { 'Content-Type': 'application/json' },
                                                                     body: JSON.stringify({ embed_model_name: settings.ragEmbedModel })
                                                                 });
-                                                                alert('重置指令已发送给 Python 守护引擎。');
+                                                                alert('后台重建索引已开始，完成后将自动切换到新模型。');
                                                             } catch (e) { }
                                                         }
                                                     }}
                                                     className="px-6 bg-rose-500 hover:bg-rose-600 text-white rounded-xl font-bold transition-colors shrink-0"
                                                 >
-                                                    切流并重置
+                                                    切换并重建索引
                                                 </button>
                                             </div>
                                         </div>
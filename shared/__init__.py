@@ -0,0 +1,4 @@
+"""
+Modules used by both the backend and the RAG service. Each service puts the repository
+root on sys.path at startup, so they are imported as `shared.<module>` from either one.
+"""
@@ -0,0 +1,155 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Incoming IDs are echoed into headers and trace files, so only plain tokens are accepted
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+_SERVER_TIMING_ENTRY_RE = re.compile(r"^\s*([A-Za-z0-9._-]+)\s*(?:;.*?dur=([0-9.]+))?")
+
+
+class Trace:
+    """
+    Spans of one request: (name, start offset, duration) in seconds, relative to the start
+    of the request. Spans may be added from worker threads the request's context was copied to.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, seconds: float):
+        # list.append is atomic, concurrent legs of one request need no lock
+        self.spans.append((name, start - self.start, seconds))
+
+    def server_timing(self) -> str:
+        """
+        The `Server-Timing` header value: spans summed per name (parallel legs of a federated
+        search add up), in order of first appearance, plus `app` for the time so far.
+        """
+        totals: Dict[str, float] = {}
+        for name, _, seconds in list(self.spans):
+            totals[name] = totals.get(name, 0.0) + seconds
+        totals["app"] = time.perf_counter() - self.start
+        return ", ".join(f"{name};dur={seconds * 1000.0:.1f}" for name, seconds in totals.items())
+
+    def to_record(self, **extra) -> Dict:
+        record = {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000.0, 2),
+        }
+        record.update(extra)
+        record["spans"] = [{"name": name, "start_ms": round(offset * 1000.0, 2), "duration_ms": round(seconds * 1000.0, 2)}
+                           for name, offset, seconds in sorted(self.spans, key=lambda s: s[1])]
+        return record
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.request_id if trace else None
+
+
+def add_span(name: str, start: float, seconds: float):
+    """
+    Records a span that was timed elsewhere (`start` from time.perf_counter()). A no-op outside a request.
+    """
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, start, seconds)
+
+
+@contextmanager
+def span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, t0, time.perf_counter() - t0)
+
+
+def merge_server_timing(header: Optional[str], prefix: str, start: float):
+    """
+    Adds the spans a downstream service reported in its `Server-Timing` header to the current
+    trace as `<prefix>.<name>`, anchored at `start` (when the downstream call was made).
+    """
+    if not header:
+        return
+    for entry in header.split(","):
+        match = _SERVER_TIMING_ENTRY_RE.match(entry)
+        if match and match.group(2):
+            add_span(f"{prefix}.{match.group(1)}", start, float(match.group(2)) / 1000.0)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware giving each request a trace. The request ID is taken from an incoming
+    `X-Request-ID` header (so one ID follows a question through the frontend, the backend and
+    the RAG service) or generated, and returned as `X-Request-ID` together with a `Server-Timing`
+    header of the spans finished before the response started. Requests slower than `slow_ms`
+    are appended to `trace_file` as one JSON line each, with every span including those of a
+    streamed body; `slow_ms` 0 turns that off.
+    """
+
+    def __init__(self, app, service: str, slow_ms: float = 0.0, trace_file: Optional[str] = None):
+        self.app = app
+        self.service = service
+        self.slow_ms = slow_ms
+        self.trace_file = trace_file
+        self._write_lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        trace = Trace(request_id)
+        token = _current.set(trace)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if self.slow_ms and self.trace_file and (time.perf_counter() - trace.start) * 1000.0 >= self.slow_ms:
+                self._dump(trace.to_record(service=self.service, method=scope["method"], path=scope["path"],
+                                           route=getattr(scope.get("route"), "path", None), status=status[0]))
+
+    def _dump(self, record: Dict):
+        try:
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with self._write_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.trace_file)), exist_ok=True)
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except Exception as e:
+            print(f"Failed to write slow trace {record['request_id']}: {e}")
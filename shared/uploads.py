@@ -0,0 +1,64 @@
+import hashlib
+import os
+import uuid
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# Read/write granularity; memory per upload stays at one chunk regardless of file size
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class StoredUpload:
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _discard(f, path: str):
+    f.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def save_upload(file: UploadFile, dest_dir: str, dest_name: str, max_bytes: int) -> StoredUpload:
+    """
+    Streams an upload to `dest_dir/dest_name` in CHUNK_SIZE pieces without blocking the event loop.
+
+    The data goes to a uniquely named .part file first and is moved into place with os.replace
+    once complete, so readers never see a half-written file and concurrent uploads of the same
+    name cannot clobber each other. Size and SHA-256 are computed on the way through.
+    Raises UploadTooLarge (after removing the partial file) once `max_bytes` is exceeded.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    tmp_path = os.path.join(dest_dir, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            await run_in_threadpool(_write_chunk, f, digest, chunk)
+    except BaseException:
+        await run_in_threadpool(_discard, f, tmp_path)
+        raise
+    await run_in_threadpool(f.close)
+
+    final_path = os.path.join(dest_dir, dest_name)
+    await run_in_threadpool(os.replace, tmp_path, final_path)
+    return StoredUpload(final_path, size, digest.hexdigest())